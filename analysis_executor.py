@@ -0,0 +1,159 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional
+
+from content_analysis import analyze_document
+
+# Documents shorter than this (in characters) are analyzed in-process: the pickling
+# round-trip costs more than the parse.
+INLINE_THRESHOLD = 20000
+
+# Maximum number of documents queued or running in the pool at once
+MAX_QUEUE_DEPTH = 32
+
+
+def _timed_analyze(content: str, content_format: str = "html"):
+    """Worker entry point: returns (analysis, started_at, compute_seconds)"""
+    started_at = time.time()
+    start = time.perf_counter()
+    analysis = analyze_document(content, content_format)
+    return analysis, started_at, time.perf_counter() - start
+
+
+class AnalysisExecutor:
+    """Runs content analysis in a process pool so CPU-bound parsing does not hold the GIL.
+
+    Input is the content string and its format, output the analysis dict, all plain picklable
+    values. Small documents run inline; when MAX_QUEUE_DEPTH documents are already
+    pending, submit() waits up to queue_timeout for a slot and then runs inline too.
+    If the pool breaks, it is replaced and its pending documents are analyzed on a
+    fallback thread; an analysis that raises resolves its future with the exception.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_queue: int = MAX_QUEUE_DEPTH,
+                 inline_threshold: int = INLINE_THRESHOLD, queue_timeout: float = 5.0):
+        self.max_workers = max_workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self.inline_threshold = inline_threshold
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._fallback = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="analysis-fallback")
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "pooled": 0, "inline": 0, "overflow_inline": 0, "fallback": 0, "errors": 0,
+            "queue_wait_seconds": 0.0, "compute_seconds": 0.0, "max_queue_wait_seconds": 0.0,
+        }
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                # spawn avoids forking a multi-threaded server process
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._pool
+
+    def _discard_pool(self, pool: ProcessPoolExecutor):
+        """Drop a broken pool (recreated on the next submit) and release its resources"""
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False)
+
+    def _record(self, timings: Optional[Dict], kind: str, wait: float, compute: float):
+        with self._stats_lock:
+            self._stats[kind] += 1
+            self._stats["queue_wait_seconds"] += wait
+            self._stats["compute_seconds"] += compute
+            self._stats["max_queue_wait_seconds"] = max(self._stats["max_queue_wait_seconds"], wait)
+            if timings is not None:
+                timings["analysis_queue_wait"] = round(timings.get("analysis_queue_wait", 0.0) + wait, 3)
+                timings["analysis_compute"] = round(timings.get("analysis_compute", 0.0) + compute, 3)
+
+    def _run_inline(self, content: str, timings: Optional[Dict], kind: str, content_format: str) -> Future:
+        future = Future()
+        analysis, _, compute = _timed_analyze(content, content_format)
+        self._record(timings, kind, 0.0, compute)
+        future.set_result(analysis)
+        return future
+
+    def submit(self, content: str, timings: Optional[Dict] = None, content_format: str = "html") -> Future:
+        """Schedule analysis of one document; the future resolves to the analysis dict.
+
+        When a timings dict is given, queue wait and compute seconds are added to its
+        'analysis_queue_wait' and 'analysis_compute' entries.
+        """
+        if len(content) < self.inline_threshold:
+            return self._run_inline(content, timings, "inline", content_format)
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            return self._run_inline(content, timings, "overflow_inline", content_format)
+
+        future = Future()
+        submitted_at = time.time()
+        try:
+            pool = self._get_pool()
+            pool_future = pool.submit(_timed_analyze, content, content_format)
+        except Exception:
+            self._slots.release()
+            raise
+
+        def fail(error: Exception):
+            with self._stats_lock:
+                self._stats["errors"] += 1
+            future.set_exception(error)
+
+        def fallback():
+            self._discard_pool(pool)
+            try:
+                analysis, _, compute = _timed_analyze(content, content_format)
+            except Exception as e:
+                fail(e)
+                return
+            self._record(timings, "fallback", 0.0, compute)
+            future.set_result(analysis)
+
+        # Runs on the pool's management thread, so anything slow goes to the fallback threads
+        def done(finished):
+            self._slots.release()
+            try:
+                analysis, started_at, compute = finished.result()
+            except BrokenProcessPool as e:
+                print(f"Analysis process pool broke, analyzing on a fallback thread: {str(e)}")
+                try:
+                    self._fallback.submit(fallback)
+                except RuntimeError as shutdown_error:  # executor already shut down
+                    fail(shutdown_error)
+                return
+            except Exception as e:
+                print(f"Pooled content analysis failed: {str(e)}")
+                fail(e)
+                return
+            self._record(timings, "pooled", max(0.0, started_at - submitted_at), compute)
+            future.set_result(analysis)
+
+        pool_future.add_done_callback(done)
+        return future
+
+    def analyze(self, content: str, timings: Optional[Dict] = None, content_format: str = "html") -> Dict:
+        return self.submit(content, timings, content_format).result()
+
+    def stats(self) -> Dict:
+        """Task counts and cumulative/average queue wait vs compute time"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        tasks = stats["pooled"] + stats["inline"] + stats["overflow_inline"] + stats["fallback"]
+        stats["avg_queue_wait_seconds"] = round(stats["queue_wait_seconds"] / stats["pooled"], 4) if stats["pooled"] else 0.0
+        stats["avg_compute_seconds"] = round(stats["compute_seconds"] / tasks, 4) if tasks else 0.0
+        return stats
+
+    def shutdown(self, wait: bool = True):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait)
+                self._pool = None
+        self._fallback.shutdown(wait=wait)
@@ -0,0 +1,373 @@
+"""HTTP/JSON API for the outline pipeline, independent of Streamlit.
+
+Run with any ASGI server, e.g.:
+
+    uvicorn api:app --host 0.0.0.0 --port 8000 --workers 4
+
+Endpoints:
+    GET  /health
+    GET  /usage     usage and cost per clock hour and provider for this process, plus
+                    OpenAI latency percentiles and error/hedge counts per model
+    POST /keywords  {"query": ..., "markets": [{"locale": "en-US", "device": "desktop"}]}
+    POST /serp      {"query": ..., "num_results": 10, "locale": "en-US"}
+    POST /outline   {"query": ..., "markets": [...], "stream": true, "reuse": false,
+                     "generation_mode": "single" | "sections", "content_format": "html" | "markdown"}
+    POST /clusters  {"query": ..., "max_depth": 2, "max_queries": 30, "max_calls": 20}
+
+/outline streams newline-delimited JSON events ({"event": "progress", ...} followed by
+{"event": "result", ...} or {"event": "error", ...}) unless "stream" is false.
+Instances keep no request state, so they can be scaled horizontally behind a load
+balancer; point OUTLINE_STORE_PATH at storage the instances share if stored results
+should be visible to all of them.
+"""
+import asyncio
+import json
+from datetime import timedelta
+from typing import Dict, Optional
+
+from config import load_config
+from key_pred2 import analyze_keywords, parse_keyword_analysis, expand_keywords_for_markets, DEFAULT_MARKET
+from og import fetch_search_results, serp_locale_params, OUTLINE_GENERATION_MODES, CONTENT_FORMATS
+from outline_store import OutlineStore
+from fingerprints import FingerprintStore
+from analysis_executor import AnalysisExecutor
+from pipeline import generate_outline, api_keys_from_config
+from metering import usage_meter, RunMeter, BudgetExceededError
+from llm_client import get_latency_stats
+from clusters import plan_clusters, CLUSTER_MAX_DEPTH, CLUSTER_MAX_QUERIES, CLUSTER_MAX_CALLS
+
+CONFIG = load_config()
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Resources:
+    """Per-process shared state, created on first use"""
+
+    def __init__(self, config: Dict):
+        self.config = config
+        self.outline_slots = None
+        self.request_slots = None
+        self.outline_store = None
+        self.fingerprint_store = None
+        self.analysis_executor = None
+
+    def setup(self):
+        if self.outline_slots is None:
+            self.outline_slots = asyncio.Semaphore(self.config["API_MAX_CONCURRENT_OUTLINES"])
+            self.request_slots = asyncio.Semaphore(self.config["API_MAX_CONCURRENT_REQUESTS"])
+            self.outline_store = OutlineStore(self.config["OUTLINE_STORE_PATH"])
+            self.fingerprint_store = FingerprintStore(self.config["OUTLINE_STORE_PATH"])
+            self.analysis_executor = AnalysisExecutor()
+
+    def shutdown(self):
+        if self.analysis_executor:
+            self.analysis_executor.shutdown(wait=False)
+
+
+resources = Resources(CONFIG)
+
+
+async def acquire_slot(semaphore: asyncio.Semaphore):
+    """Wait for a concurrency slot, or fail with 503 so the load balancer can retry elsewhere"""
+    try:
+        await asyncio.wait_for(semaphore.acquire(), timeout=CONFIG["API_QUEUE_TIMEOUT"])
+    except asyncio.TimeoutError:
+        raise ApiError(503, "Server busy, retry later")
+
+
+def _markets(body: Dict):
+    markets = body.get("markets") or [DEFAULT_MARKET]
+    if not isinstance(markets, list) or not all(isinstance(m, dict) and m.get("locale") for m in markets):
+        raise ApiError(400, "'markets' must be a list of objects with a 'locale'")
+    return markets
+
+
+def _query(body: Dict) -> str:
+    query = body.get("query")
+    if not isinstance(query, str) or not query.strip():
+        raise ApiError(400, "'query' is required")
+    return query.strip()
+
+
+def _int_option(body: Dict, name: str, default: int, minimum: int = 1, maximum: Optional[int] = None) -> int:
+    """Integer request option within [minimum, maximum]; anything else is a 400"""
+    value = body.get(name, default)
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ApiError(400, f"'{name}' must be an integer")
+    try:
+        value = int(value)
+    except ValueError:
+        raise ApiError(400, f"'{name}' must be an integer")
+    if value < minimum or (maximum is not None and value > maximum):
+        bounds = f"between {minimum} and {maximum}" if maximum is not None else f"at least {minimum}"
+        raise ApiError(400, f"'{name}' must be {bounds}")
+    return value
+
+
+def _locale(body: Dict) -> str:
+    locale = body.get("locale", DEFAULT_MARKET["locale"])
+    if not isinstance(locale, str) or not locale:
+        raise ApiError(400, "'locale' must be a string such as 'en-US'")
+    return locale
+
+
+def _choice(body: Dict, name: str, choices) -> Optional[str]:
+    """Optional string option restricted to choices; None leaves the configured default"""
+    value = body.get(name)
+    if value is not None and value not in choices:
+        raise ApiError(400, f"'{name}' must be one of: {', '.join(choices)}")
+    return value
+
+
+def _outline_options(body: Dict) -> Dict:
+    return {
+        "generation_mode": _choice(body, "generation_mode", OUTLINE_GENERATION_MODES),
+        "content_format": _choice(body, "content_format", CONTENT_FORMATS),
+    }
+
+
+def _max_age(body: Dict) -> timedelta:
+    return timedelta(days=_int_option(body, "max_age_days", 7, minimum=0))
+
+
+def _public_result(result: Dict) -> Dict:
+    """Pipeline result without the raw SERP payload"""
+    return {key: value for key, value in result.items() if key != "serp_data"}
+
+
+# --- handlers -------------------------------------------------------------------
+
+async def handle_health(body: Dict):
+    return 200, {"status": "ok"}
+
+
+async def handle_usage(body: Dict):
+    return 200, {**usage_meter.summary(), "llm_latency": get_latency_stats()}
+
+
+async def handle_keywords(body: Dict):
+    query, markets = _query(body), _markets(body)
+    meter = RunMeter(label=f"keywords: {query}")
+    meter.check("keywords")
+    await acquire_slot(resources.request_slots)
+    status = "error"
+    try:
+        keywords_data = await asyncio.to_thread(expand_keywords_for_markets, query, markets, meter=meter)
+        analysis = await asyncio.to_thread(analyze_keywords, query, keywords_data, on_usage=meter) if keywords_data else ""
+        status = "ok"
+    finally:
+        resources.request_slots.release()
+        meter.finish(status)
+    return 200, {
+        "query": query,
+        "keywords": keywords_data,
+        "analysis": parse_keyword_analysis(analysis),
+    }
+
+
+async def handle_serp(body: Dict):
+    query, locale = _query(body), _locale(body)
+    num_results = _int_option(body, "num_results", 10, maximum=100)
+    meter = RunMeter(label=f"serp: {query}")
+    meter.check("serp")
+    await acquire_slot(resources.request_slots)
+    status = "error"
+    try:
+        serp_data = await asyncio.to_thread(
+            fetch_search_results, query, CONFIG["SERPAPI_KEY"], num_results, **serp_locale_params(locale)
+        )
+        if not serp_data:
+            raise ApiError(502, "Failed to fetch SERP data")
+        meter.record_serp(serp_data)
+        status = "ok"
+    finally:
+        resources.request_slots.release()
+        meter.finish(status)
+    return 200, serp_data
+
+
+async def handle_clusters(body: Dict):
+    query = _query(body)
+    options = {
+        "max_depth": _int_option(body, "max_depth", CLUSTER_MAX_DEPTH, minimum=0, maximum=CLUSTER_MAX_DEPTH),
+        "max_queries": _int_option(body, "max_queries", CLUSTER_MAX_QUERIES, maximum=CLUSTER_MAX_QUERIES),
+        "max_calls": _int_option(body, "max_calls", CLUSTER_MAX_CALLS, maximum=CLUSTER_MAX_CALLS),
+        "locale": _locale(body),
+    }
+    meter = RunMeter(label=f"clusters: {query}")
+    meter.check("clusters")
+    await acquire_slot(resources.outline_slots)
+    status = "error"
+    try:
+        plan = await asyncio.to_thread(plan_clusters, query, CONFIG["SERPAPI_KEY"], meter=meter, **options)
+        status = "ok"
+    finally:
+        resources.outline_slots.release()
+        meter.finish(status)
+    return 200, plan
+
+
+async def outline_events(body: Dict):
+    """Yield progress events while the pipeline runs in a worker thread, then the result"""
+    query, markets, options = _query(body), _markets(body), _outline_options(body)
+
+    if body.get("reuse"):
+        previous = resources.outline_store.latest(query, max_age=_max_age(body))
+        if previous:
+            yield {"event": "result", "reused": True, **previous}
+            return
+
+    await acquire_slot(resources.outline_slots)
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+
+    def progress(message: str, value: float):
+        loop.call_soon_threadsafe(events.put_nowait, {"event": "progress", "message": message, "progress": value})
+
+    def run():
+        return generate_outline(
+            query, api_keys_from_config(CONFIG), markets=markets, progress=progress,
+            fingerprint_store=resources.fingerprint_store,
+            analysis_executor=resources.analysis_executor,
+            search_results=fetch_search_results,
+            **options
+        )
+
+    try:
+        task = asyncio.ensure_future(asyncio.to_thread(run))
+        while not task.done() or not events.empty():
+            getter = asyncio.ensure_future(events.get())
+            done, _ = await asyncio.wait({task, getter}, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                yield getter.result()
+            else:
+                getter.cancel()
+        try:
+            result = task.result()
+        except Exception as e:
+            yield {"event": "error", "message": str(e)}
+            return
+        result["id"] = await asyncio.to_thread(resources.outline_store.append, result)
+        yield {"event": "result", "reused": False, **_public_result(result)}
+    finally:
+        resources.outline_slots.release()
+
+
+ROUTES = {
+    ("GET", "/health"): handle_health,
+    ("GET", "/usage"): handle_usage,
+    ("POST", "/keywords"): handle_keywords,
+    ("POST", "/serp"): handle_serp,
+    ("POST", "/clusters"): handle_clusters,
+}
+
+
+# --- ASGI plumbing --------------------------------------------------------------
+
+async def _read_json(receive) -> Dict:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    raw = b"".join(chunks)
+    if not raw:
+        return {}
+    try:
+        body = json.loads(raw)
+    except ValueError:
+        raise ApiError(400, "Request body must be JSON")
+    if not isinstance(body, dict):
+        raise ApiError(400, "Request body must be a JSON object")
+    return body
+
+
+async def _send_json(send, status: int, payload):
+    data = json.dumps(payload, default=str).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(data)).encode())],
+    })
+    await send({"type": "http.response.body", "body": data})
+
+
+async def _send_stream(send, events):
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", b"application/x-ndjson"), (b"cache-control", b"no-cache")],
+    })
+    # Headers are already sent, so failures become a final error event in the stream
+    error = None
+    try:
+        async for event in events:
+            line = json.dumps(event, default=str).encode("utf-8") + b"\n"
+            await send({"type": "http.response.body", "body": line, "more_body": True})
+    except ApiError as e:
+        error = {"event": "error", "status": e.status, "message": e.message}
+    except BudgetExceededError as e:
+        error = {"event": "error", "status": 429, "message": str(e)}
+    except Exception as e:
+        print(f"Error streaming outline: {str(e)}")
+        error = {"event": "error", "status": 500, "message": "Internal server error"}
+    finally:
+        await events.aclose()
+    if error:
+        await send({"type": "http.response.body", "body": json.dumps(error).encode("utf-8") + b"\n", "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            resources.setup()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            resources.shutdown()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    resources.setup()  # no-op after lifespan startup; covers servers without lifespan
+    method, path = scope["method"], scope["path"].rstrip("/") or "/"
+    try:
+        body = await _read_json(receive) if method == "POST" else {}
+        if (method, path) == ("POST", "/outline"):
+            if body.get("stream", True):
+                # Validate before the 200 streaming response starts
+                _query(body), _markets(body), _max_age(body), _outline_options(body)
+                await _send_stream(send, outline_events(body))
+                return
+            events = [event async for event in outline_events(body)]
+            final = events[-1] if events else {"event": "error", "message": "No result"}
+            await _send_json(send, 200 if final["event"] == "result" else 502, final)
+            return
+
+        handler = ROUTES.get((method, path))
+        if handler is None:
+            raise ApiError(404, "Not found")
+        status, payload = await handler(body)
+        await _send_json(send, status, payload)
+    except ApiError as e:
+        await _send_json(send, e.status, {"error": e.message})
+    except BudgetExceededError as e:
+        await _send_json(send, 429, {"error": str(e)})
+    except Exception as e:
+        print(f"Error handling {method} {path}: {str(e)}")
+        await _send_json(send, 500, {"error": "Internal server error"})
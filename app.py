@@ -1,9 +1,14 @@
 import streamlit as st
-from og import LLMEnhancedAnalyzer, get_search_results
-from key_pred2 import get_suggested_keywords, get_keyword_metrics, analyze_keywords
+from key_pred2 import market_label, DEFAULT_MARKET, MARKET_PRESETS
+from outline_store import OutlineStore, query_key
+from fingerprints import FingerprintStore
+from og import fetch_search_results, OUTLINE_GENERATION, OUTLINE_GENERATION_MODES, CONTENT_FORMAT, CONTENT_FORMATS
+from query_index import QueryIndex, SIMILARITY_THRESHOLD
+from pipeline import generate_outline
+from analysis_executor import AnalysisExecutor
 import json
-from datetime import datetime
-import time
+import threading
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import os
 from typing import List, Dict
@@ -48,76 +53,44 @@ def safe_split(text, delimiter1, delimiter2=None):
         st.error(f"Error processing content: {str(e)}")
         return ""
 
-def display_enhanced_outline(enhanced_outline: str):
-    """
-    Display enhanced outline with improved error handling and content parsing
-    """
-    try:
-        if not enhanced_outline or not isinstance(enhanced_outline, str):
-            st.error("No valid outline content available")
-            return
-
-        # Define sections and their delimiters
-        sections = {
-            "Meta Title": ("Meta title:", "Meta description:"),
-            "Meta Description": ("Meta description:", "Slug:"),
-            "Slug": ("Slug:", "Outline:"),
-            "H1 Options": ("H1 Options:", "Introduction:"),
-            "Introduction": ("Introduction:", "Writing Guidelines:"),
-            "Writing Guidelines": ("Writing Guidelines:", "Article Type Prediction:"),
-            "Article Type Prediction": ("Article Type Prediction:", "Justification:"),
-            "Justification": ("Justification:", None)
-        }
-
-        st.markdown("<p class='big-font'>Enhanced Content Outline:</p>", unsafe_allow_html=True)
-        
-        for section_name, (start_delimiter, end_delimiter) in sections.items():
-            try:
-                content = safe_split(enhanced_outline, start_delimiter, end_delimiter)
-                
-                if not content:
-                    continue  # Skip empty sections instead of displaying them
-                
-                if section_name == "H1 Options":
-                    st.markdown("<div class='medium-font'>", unsafe_allow_html=True)
-                    st.markdown(f"<p><strong>{section_name}:</strong></p>", unsafe_allow_html=True)
-                    # Split by bullet points or numbers at the start of a line
-                    options = [opt.strip() for opt in content.split('\n') if opt.strip()]
-                    # Remove bullet points or numbers if they exist
-                    options = [opt[2:] if opt.startswith('- ') else opt for opt in options]
-                    options = [opt[3:] if opt[0].isdigit() and opt[1:3] == '. ' else opt for opt in options]
-                    for opt in options:
-                        if opt:  # Only display non-empty options
-                            st.markdown(f"• {opt}", unsafe_allow_html=True)
-                    st.markdown("</div>", unsafe_allow_html=True)
-                
-                elif section_name == "Writing Guidelines":
-                    st.markdown("<div class='medium-font'>", unsafe_allow_html=True)
-                    st.markdown(f"<p><strong>{section_name}:</strong></p>", unsafe_allow_html=True)
-                    # Split by bullet points or new lines
-                    guidelines = [g.strip() for g in content.split('\n') if g.strip()]
-                    # Remove bullet points if they exist
-                    guidelines = [g[2:] if g.startswith('- ') else g for g in guidelines]
-                    for guideline in guidelines:
-                        if guideline:  # Only display non-empty guidelines
-                            st.markdown(f"• {guideline}", unsafe_allow_html=True)
-                    st.markdown("</div>", unsafe_allow_html=True)
-                
-                else:
-                    st.markdown(
-                        f"""<div class='medium-font'>
-                            <p><strong>{section_name}:</strong><br>{content}</p>
-                        </div>""",
-                        unsafe_allow_html=True
-                    )
-            
-            except Exception as e:
-                st.warning(f"Error displaying section {section_name}: {str(e)}")
-                continue  # Continue with next section even if one fails
+# Outline sections shown in the app and their delimiters
+DISPLAY_SECTIONS = {
+    "Meta Title": ("Meta title:", "Meta description:"),
+    "Meta Description": ("Meta description:", "Slug:"),
+    "Slug": ("Slug:", "Outline:"),
+    "H1 Options": ("H1 Options:", "Introduction:"),
+    "Introduction": ("Introduction:", "Writing Guidelines:"),
+    "Writing Guidelines": ("Writing Guidelines:", "Article Type Prediction:"),
+    "Article Type Prediction": ("Article Type Prediction:", "Justification:"),
+    "Justification": ("Justification:", None)
+}
 
-    except Exception as e:
-        st.error(f"Error displaying outline: {str(e)}")
-        st.error("Detailed error info:", exc_info=True)
+
+def _bullets(content: str, strip_numbers: bool = False) -> List[str]:
+    """Non-empty lines with leading '- ' (and optionally '1. ') removed"""
+    items = [line.strip() for line in content.split('\n') if line.strip()]
+    items = [item[2:] if item.startswith('- ') else item for item in items]
+    if strip_numbers:
+        items = [item[3:] if item[0].isdigit() and item[1:3] == '. ' else item for item in items]
+    return [item for item in items if item]
+
+
+def build_outline_html(enhanced_outline: str) -> str:
+    """HTML for the outline sections, built once so it can be rendered in one call"""
+    parts = ["<p class='big-font'>Enhanced Content Outline:</p>"]
+    for section_name, (start_delimiter, end_delimiter) in DISPLAY_SECTIONS.items():
+        content = safe_split(enhanced_outline, start_delimiter, end_delimiter)
+        if not content:
+            continue  # Skip empty sections instead of displaying them
+
+        if section_name == "H1 Options":
+            body = "<br>".join(f"• {option}" for option in _bullets(content, strip_numbers=True))
+        elif section_name == "Writing Guidelines":
+            body = "<br>".join(f"• {guideline}" for guideline in _bullets(content))
+        else:
+            body = content
+        parts.append(f"<div class='medium-font'><p><strong>{section_name}:</strong><br>{body}</p></div>")
+    return "\n".join(parts)
 
 # Load environment variables
 load_dotenv()
@@ -169,6 +142,265 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
+def _log_template(*lines: str) -> str:
+    return (
+        "<div class='log-font'>[⏱️ {time}] " + "<br>".join(lines)
+        + "<div style='height: 2px; background: linear-gradient(to right, #00ff00 {progress}%, "
+          "transparent {progress}%); margin-top: 5px;'></div></div>"
+    )
+
+
+# Log entries per pipeline progress value, built once; other values show the message itself
+LOG_TEMPLATES = {
+    0.05: _log_template("🤖 Hey there! I'm your AI Content Assistant.", "🚀 Let's create something amazing together!",
+                        "🎯 Analyzing your query: \"{query}\"..."),
+    0.1: _log_template("🔍 Diving into the keyword universe...", "📊 Looking for the most valuable keyword opportunities.",
+                       "⚡ This might take a moment, but it'll be worth it!"),
+    0.2: _log_template("📈 Crunching the numbers...", "🎲 Analyzing search volumes and competition metrics",
+                       "🎯 Finding the perfect balance for your content strategy"),
+    0.3: _log_template("🧠 Engaging advanced AI analysis...", "🎯 Determining content intent and focus",
+                       "🔄 Processing keyword relationships and patterns"),
+    0.5: _log_template("🌐 Exploring the digital landscape...", "🔍 Analyzing top-performing content",
+                       "📊 Gathering competitive insights"),
+    0.6: _log_template("⚙️ Powering up the content engine...", "🤖 Initializing advanced content analysis",
+                       "🎯 Preparing to craft your perfect outline"),
+    0.7: _log_template("🔎 Investigating competitor strategies...", "📝 Learning from the best in your niche",
+                       "💡 Discovering unique opportunities"),
+    0.9: _log_template("✍️ Almost there! Crafting your masterpiece...", "🎨 Adding creative touches",
+                       "🎯 Ensuring SEO optimization"),
+    1.0: _log_template("🎉 Success! Your content strategy is ready!", "⭐ Thanks for your patience",
+                       "📈 Let's review your personalized content plan below"),
+}
+LOG_DEFAULT_TEMPLATE = _log_template("{message}")
+
+
+def render_log(message: str, progress_value: float, query: str) -> str:
+    template = LOG_TEMPLATES.get(progress_value, LOG_DEFAULT_TEMPLATE)
+    return template.format(
+        time=datetime.now().strftime("%H:%M:%S"),
+        progress=progress_value * 100,
+        message=message,
+        query=query
+    )
+
+
+# Partial reruns need st.fragment (Streamlit 1.37+) or st.experimental_fragment. With
+# them the pipeline runs in a background thread and a polling fragment shows its
+# progress; older versions run it inline and rerun the whole script as before.
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+LIVE_PANELS = _fragment is not None
+LIVE_REFRESH_SECONDS = 1.0
+
+
+def fragment(run_every=None):
+    """st.fragment where available, otherwise the undecorated function"""
+    if _fragment is None:
+        return lambda func: func
+    return _fragment(run_every=run_every)
+
+
+@st.cache_resource
+def get_outline_store():
+    return OutlineStore()
+
+
+@st.cache_resource
+def get_fingerprint_store():
+    return FingerprintStore()
+
+
+@st.cache_resource
+def get_analysis_executor():
+    """Process pool for content analysis, shared by all Streamlit sessions"""
+    return AnalysisExecutor()
+
+
+def _streamlit_log(level: str, message: str):
+    {'info': st.write, 'warning': st.warning, 'error': st.error}.get(level, st.write)(message)
+
+
+@st.cache_data(ttl=3600)
+def get_search_results(query: str, api_key: str, num_results: int = 10, hl: str = "en", gl: str = "us",
+                       _log=_streamlit_log) -> Dict:
+    """Cached SerpAPI fetch that reports progress in the Streamlit page (or to _log)"""
+    return fetch_search_results(query, api_key, num_results, hl, gl, log=_log)
+
+
+def _console_log(level: str, message: str):
+    print(message)
+
+
+@st.cache_resource
+def get_query_index():
+    return QueryIndex.from_store(get_outline_store())
+
+
+def find_reusable_result(query: str, max_age: timedelta):
+    """Stored result for the same or a near-duplicate query, with the similarity it matched at"""
+    store = get_outline_store()
+    previous = store.latest(query, max_age=max_age)
+    if previous:
+        return previous, 1.0
+    match = get_query_index().best_match(query, SIMILARITY_THRESHOLD)
+    if match:
+        previous = store.get(match["ref"])
+        if previous and previous["created_at"] >= (datetime.now() - max_age).isoformat(timespec="seconds"):
+            return previous, match["similarity"]
+    return None, 0.0
+
+
+def build_result_view(result: Dict, notice: str = "") -> Dict:
+    """Everything needed to show a result, pre-rendered so reruns only emit it"""
+    html = f"""
+        <p class='big-font'>Keyword Analysis Result:</p>
+        <div class='medium-font'>
+            <p><strong>Primary keyword:</strong><br>{result['primary_keyword']}</p>
+            <p><strong>Secondary keywords:</strong><br>{', '.join(result['secondary_keywords'] or [])}</p>
+        </div>
+    """
+    outline = result.get('outline') or ""
+    if outline:
+        try:
+            html += build_outline_html(outline)
+        except Exception as e:
+            print(f"Error building outline view: {str(e)}")
+
+    usage = result.get('usage')
+    caption = ""
+    if usage:
+        caption = (
+            f"Run cost: ${usage['cost_usd']:.4f} of ${usage['budget_usd']:.2f} budget"
+            + (f" (reduced: {'; '.join(usage['reductions'])})" if usage.get('reductions') else "")
+        )
+    return {"query": result['query'], "html": html, "outline": outline, "caption": caption, "notice": notice}
+
+
+def render_result_view(view: Dict):
+    if view["notice"]:
+        st.info(view["notice"])
+    st.markdown(view["html"], unsafe_allow_html=True)
+    if not view["outline"]:
+        st.error("Failed to generate enhanced outline.")
+    if view["caption"]:
+        st.caption(view["caption"])
+
+
+# Results kept per browser session, so reruns and widget interactions re-render instead of re-running
+MAX_SESSION_RESULTS = 20
+
+
+def session_key(query: str, market_labels: List[str]) -> str:
+    return f"{query_key(query)}|{','.join(sorted(market_labels))}"
+
+
+def remember_view(key: str, view: Dict):
+    views = st.session_state.setdefault("result_views", {})
+    views.pop(key, None)
+    views[key] = view
+    while len(views) > MAX_SESSION_RESULTS:
+        views.pop(next(iter(views)))
+    st.session_state["active_result"] = key
+
+
+@fragment()
+def result_panel():
+    """Shows the active result; its widgets rerun only this fragment"""
+    view = st.session_state.get("result_views", {}).get(st.session_state.get("active_result"))
+    if not view:
+        return
+    mode = st.radio("Outline view", ["Formatted", "Raw text"], horizontal=True, key="outline_view")
+    if mode == "Formatted":
+        render_result_view(view)
+    else:
+        st.text(view["outline"])
+    st.download_button(
+        "Download outline", view["outline"], file_name=f"{query_key(view['query']).replace(' ', '-')}.txt",
+        disabled=not view["outline"]
+    )
+
+
+def new_job(key: str, query: str) -> Dict:
+    """State of one pipeline run, shared between the run and the panels showing it"""
+    return {"key": key, "query": query, "status": "running", "log": "", "progress": 0.0,
+            "view": None, "error": None, "collected": False}
+
+
+def run_job(job: Dict, on_update=None, **pipeline_args):
+    """Run the pipeline for a job, recording progress and the outcome in the job.
+
+    Progress goes to the job dict rather than the page, so it can run in a background thread.
+    """
+    def update_log(message, progress_value):
+        job["log"] = render_log(message, progress_value, job["query"])
+        job["progress"] = progress_value
+        if on_update:
+            on_update()
+
+    outline_store, query_index = get_outline_store(), get_query_index()
+    try:
+        update_log("🚀 Initializing analysis process...", 0.05)
+
+        result = generate_outline(
+            job["query"],
+            {"firecrawl": FIRECRAWL_API_KEY, "openai": OPENAI_API_KEY, "serpapi": SERPAPI_KEY},
+            progress=update_log,
+            **pipeline_args
+        )
+        run_id = outline_store.append(result)
+        if run_id is not None:
+            query_index.add(job["query"], run_id)
+        job["view"] = build_result_view(result)
+
+        update_log("🎉 Analysis completed successfully! Preparing results...", 1.0)
+        job["status"] = "done"
+    except Exception as e:
+        job["error"] = str(e)
+        update_log(f"❌ Error encountered: {str(e)}", 1.0)
+        job["status"] = "failed"
+
+
+def start_job(job: Dict, **pipeline_args):
+    """Run a job in a background thread; live_log_panel polls it"""
+    from streamlit.runtime.scriptrunner import add_script_run_ctx  # present wherever fragments are
+
+    # The SERP cache must not write to the page from another thread
+    pipeline_args["search_results"] = lambda *args, **kwargs: get_search_results(*args, _log=_console_log, **kwargs)
+    thread = threading.Thread(target=run_job, args=(job,), kwargs=pipeline_args, daemon=True)
+    add_script_run_ctx(thread)
+    thread.start()
+
+
+def collect_job(job: Dict):
+    """Keep the view of a finished job once, like any other result of this session"""
+    if job["status"] == "done" and not job["collected"]:
+        job["collected"] = True
+        remember_view(job["key"], job["view"])
+
+
+def render_job(job: Dict):
+    if job["log"]:
+        st.markdown(job["log"], unsafe_allow_html=True)
+    if job["status"] == "running":
+        st.progress(job["progress"])
+    elif job["status"] == "done":
+        st.success("Analysis completed successfully!")
+    else:
+        st.error(f"Analysis failed: {job['error']}")
+
+
+@fragment(run_every=LIVE_REFRESH_SECONDS)
+def live_log_panel():
+    """Progress of the running job, refreshed without rerunning the page; reruns the
+    whole page once the job has finished so its result is shown"""
+    job = st.session_state.get("job")
+    if not job:
+        return
+    render_job(job)
+    if job["status"] != "running":
+        collect_job(job)
+        st.rerun()
+
+
 def main():
     st.markdown("<h1 style='text-align: center;'>Outline Generator</h1>", unsafe_allow_html=True)
     
@@ -179,218 +411,92 @@ def main():
     with col1:
         st.markdown("<p class='big-font'>Input Parameters</p>", unsafe_allow_html=True)
         initial_query = st.text_input("Enter your search query:", key="search_query")
-        analyze_button = st.button("Generate Analysis")
+        market_options = {market_label(m): m for m in MARKET_PRESETS}
+        selected_labels = st.multiselect(
+            "Markets:", list(market_options), default=[market_label(DEFAULT_MARKET)], key="markets"
+        )
+        selected_markets = [market_options[label] for label in selected_labels] or [DEFAULT_MARKET]
+        reuse_previous = st.checkbox("Reuse a result for this or a near-identical query from the last 7 days", value=True)
+        with st.expander("Generation options"):
+            generation_mode = st.radio(
+                "Outline generation:", OUTLINE_GENERATION_MODES,
+                index=OUTLINE_GENERATION_MODES.index(OUTLINE_GENERATION), horizontal=True,
+                help="'sections' writes meta, body, FAQ and guidelines in parallel requests"
+            )
+            content_format = st.radio(
+                "Competitor content:", CONTENT_FORMATS,
+                index=CONTENT_FORMATS.index(CONTENT_FORMAT), horizontal=True,
+                help="'markdown' skips the HTML download and parse"
+            )
+        job = st.session_state.get("job")
+        analyze_button = st.button("Generate Analysis", disabled=bool(job and job["status"] == "running"))
 
         # Add log section in left column
         st.markdown("<p class='big-font'>Analysis Logs</p>", unsafe_allow_html=True)
-        log_placeholder = st.empty()
+        log_area = st.container()
+
+    current_key = session_key(initial_query, selected_labels)
+    views = st.session_state.setdefault("result_views", {})
+    if job:
+        # A background run may have finished since the last rerun
+        collect_job(job)
 
     # Right column - Results
     with col2:
-        if analyze_button:
-            try:
-                # Initialize progress bar
-                progress_bar = st.progress(0)
-                
-                def update_log(message, progress_value):
-                    current_time = datetime.now().strftime("%H:%M:%S")
-                    messages = {
-                        0.05: """
-                            <div class='log-font'>
-                                [⏱️ {time}] 🤖 Hey there! I'm your AI Content Assistant.
-                                <br>🚀 Let's create something amazing together!
-                                <br>🎯 Analyzing your query: "{query}"...
-                                <div style='height: 2px; background: linear-gradient(to right, #00ff00 {progress}%, transparent {progress}%); margin-top: 5px;'></div>
-                            </div>
-                        """,
-                        0.1: """
-                            <div class='log-font'>
-                                [⏱️ {time}] 🔍 Diving into the keyword universe...
-                                <br>📊 Looking for the most valuable keyword opportunities.
-                                <br>⚡ This might take a moment, but it'll be worth it!
-                                <div style='height: 2px; background: linear-gradient(to right, #00ff00 {progress}%, transparent {progress}%); margin-top: 5px;'></div>
-                            </div>
-                        """,
-                        0.2: """
-                            <div class='log-font'>
-                                [⏱️ {time}] 📈 Crunching the numbers...
-                                <br>🎲 Analyzing search volumes and competition metrics
-                                <br>🎯 Finding the perfect balance for your content strategy
-                                <div style='height: 2px; background: linear-gradient(to right, #00ff00 {progress}%, transparent {progress}%); margin-top: 5px;'></div>
-                            </div>
-                        """,
-                        0.3: """
-                            <div class='log-font'>
-                                [⏱️ {time}] 🧠 Engaging advanced AI analysis...
-                                <br>🎯 Determining content intent and focus
-                                <br>🔄 Processing keyword relationships and patterns
-                                <div style='height: 2px; background: linear-gradient(to right, #00ff00 {progress}%, transparent {progress}%); margin-top: 5px;'></div>
-                            </div>
-                        """,
-                        0.5: """
-                            <div class='log-font'>
-                                [⏱️ {time}] 🌐 Exploring the digital landscape...
-                                <br>🔍 Analyzing top-performing content
-                                <br>📊 Gathering competitive insights
-                                <div style='height: 2px; background: linear-gradient(to right, #00ff00 {progress}%, transparent {progress}%); margin-top: 5px;'></div>
-                            </div>
-                        """,
-                        0.6: """
-                            <div class='log-font'>
-                                [⏱️ {time}] ⚙️ Powering up the content engine...
-                                <br>🤖 Initializing advanced content analysis
-                                <br>🎯 Preparing to craft your perfect outline
-                                <div style='height: 2px; background: linear-gradient(to right, #00ff00 {progress}%, transparent {progress}%); margin-top: 5px;'></div>
-                            </div>
-                        """,
-                        0.7: """
-                            <div class='log-font'>
-                                [⏱️ {time}] 🔎 Investigating competitor strategies...
-                                <br>📝 Learning from the best in your niche
-                                <br>💡 Discovering unique opportunities
-                                <div style='height: 2px; background: linear-gradient(to right, #00ff00 {progress}%, transparent {progress}%); margin-top: 5px;'></div>
-                            </div>
-                        """,
-                        0.9: """
-                            <div class='log-font'>
-                                [⏱️ {time}] ✍️ Almost there! Crafting your masterpiece...
-                                <br>🎨 Adding creative touches
-                                <br>🎯 Ensuring SEO optimization
-                                <div style='height: 2px; background: linear-gradient(to right, #00ff00 {progress}%, transparent {progress}%); margin-top: 5px;'></div>
-                            </div>
-                        """,
-                        1.0: """
-                            <div class='log-font'>
-                                [⏱️ {time}] 🎉 Success! Your content strategy is ready!
-                                <br>⭐ Thanks for your patience
-                                <br>📈 Let's review your personalized content plan below
-                                <div style='height: 2px; background: linear-gradient(to right, #00ff00 {progress}%, transparent {progress}%); margin-top: 5px;'></div>
-                            </div>
-                        """
-                    }
-                    
-                    styled_message = messages.get(progress_value, """
-                        <div class='log-font'>
-                            [⏱️ {time}] {message}
-                            <div style='height: 2px; background: linear-gradient(to right, #00ff00 {progress}%, transparent {progress}%); margin-top: 5px;'></div>
-                        </div>
-                    """)
-                    
-                    log_placeholder.markdown(
-                        styled_message.format(
-                            time=current_time,
-                            progress=progress_value * 100,
-                            message=message,
-                            query=initial_query
-                        ),
-                        unsafe_allow_html=True
-                    )
-                    progress_bar.progress(progress_value)
-
-                update_log("🚀 Initializing analysis process...", 0.05)
-                time.sleep(0.5)
-
-                update_log("🔍 Getting keyword suggestions and analysis...", 0.1)
-                suggested_keywords = get_suggested_keywords(initial_query)
-                if not suggested_keywords:
-                    st.error("❌ No suggested keywords found.")
-                    return
-
-                update_log("📊 Processing keyword metrics...", 0.2)
-                keywords_data = []
-                seen_keywords = set()
-
-                for suggestion in suggested_keywords[:10]:
-                    keyword_text = suggestion["keyword"].strip()
-                    if keyword_text in seen_keywords:
-                        continue
-                    
-                    seen_keywords.add(keyword_text)
-                    metrics = get_keyword_metrics(keyword_text)
-                    
-                    if metrics is None:
-                        continue
-
-                    keyword_entry = {
-                        "keyword": keyword_text,
-                        "volume": metrics.get("volume", "N/A"),
-                        "difficulty": metrics.get("difficulty", "N/A"),
-                        "organic_ctr": metrics.get("organic_ctr", "N/A"),
-                        "priority": metrics.get("priority", "N/A"),
-                    }
-                    keywords_data.append(keyword_entry)
-
-                update_log("🎯 Analyzing keywords...", 0.3)
-                analysis_result = analyze_keywords(initial_query, keywords_data)
-                
-                # Parse the analysis result to get intent along with keywords
-                primary_keyword = ""
-                secondary_keywords = []
-                content_intent = ""
-                
-                for line in analysis_result.split('\n'):
-                    if line.startswith("Primary keyword:"):
-                        primary_keyword = line.split(":")[1].strip()
-                    elif line.startswith("Secondary keywords:"):
-                        secondary_keywords = [k.strip() for k in line.split(":")[1].split(",")]
-                    elif line.startswith("Intent:"):
-                        content_intent = line.split(":")[1].strip()
-
-                update_log("🌐 Fetching SERP data...", 0.5)
-                serp_data = get_search_results(primary_keyword, SERPAPI_KEY)
-                
-                if not serp_data:
-                    st.error("Failed to fetch SERP data")
-                    return
-
-                update_log("⚙️ Initializing content analyzer...", 0.6)
-                analyzer = LLMEnhancedAnalyzer(
-                    firecrawl_api_key=FIRECRAWL_API_KEY,
-                    openai_api_key=OPENAI_API_KEY
-                )
-                
-                # Use the automatically determined intent
-                analyzer.set_content_parameters(
-                    intent=content_intent,
-                    keywords=secondary_keywords
-                )
-                
-                # Filter out unsupported sites from SERP results
-                urls_to_scrape = [
-                    result['link'] 
-                    for result in serp_data.get('organic_results', [])[:7]  # Get more results to compensate for filtered ones
-                    if not any(domain in result['link'].lower() 
-                             for domain in ['youtube.com', 'reddit.com', 'twitter.com', 'facebook.com'])
-                ][:5]  # Keep only first 5 supported URLs
-                
-                update_log("🔎 Scanning competitor content...", 0.7)
-                scraped_data = analyzer.scrape_competitor_content(urls_to_scrape)
-                
-                update_log("✍️ Crafting enhanced content outline...", 0.9)
-                enhanced_outline = analyzer.generate_enhanced_outline(serp_data, scraped_data)
-                
-                update_log("🎉 Analysis completed successfully! Preparing results...", 1.0)
-                time.sleep(0.5)  # Add small delay for visual effect
-                
-                st.markdown("<p class='big-font'>Keyword Analysis Result:</p>", unsafe_allow_html=True)
-                st.markdown(f"""
-                    <div class='medium-font'>
-                        <p><strong>Primary keyword:</strong><br>{primary_keyword}</p>
-                        <p><strong>Secondary keywords:</strong><br>{', '.join(secondary_keywords)}</p>
-                    </div>
-                """, unsafe_allow_html=True)
-
-               # Replace with this new code
-                if enhanced_outline:
-                    display_enhanced_outline(enhanced_outline)
-                else:
-                    st.error("Failed to generate enhanced outline.")
-                
-                st.success("Analysis completed successfully!")
-                
-            except Exception as e:
-                update_log(f"❌ Error encountered: {str(e)}", 1.0)
-                st.error(f"Analysis failed: {str(e)}")
+        run_pipeline = analyze_button
+        if analyze_button and reuse_previous and current_key in views:
+            st.session_state["active_result"] = current_key
+            run_pipeline = False
+        elif analyze_button and reuse_previous:
+            previous, similarity = find_reusable_result(initial_query, timedelta(days=7))
+            if previous:
+                # Name the stored query whenever it is not literally what was typed
+                matched = "" if previous['query'] == initial_query else f" for \"{previous['query']}\" (similarity {similarity:.2f})"
+                remember_view(current_key, build_result_view(
+                    previous,
+                    notice=f"Showing the outline generated{matched} on {previous['created_at']}. "
+                           "Untick 'Reuse' to generate a fresh one."
+                ))
+                run_pipeline = False
+
+        if run_pipeline:
+            # Until this run succeeds there is no result for the current input to show
+            st.session_state["active_result"] = None
+
+            job = st.session_state["job"] = new_job(current_key, initial_query)
+            pipeline_args = dict(
+                markets=selected_markets,
+                fingerprint_store=get_fingerprint_store(),
+                analysis_executor=get_analysis_executor(),
+                search_results=get_search_results,
+                generation_mode=generation_mode,
+                content_format=content_format
+            )
+            if LIVE_PANELS:
+                start_job(job, **pipeline_args)
+            else:
+                with log_area:
+                    live_log = st.empty()
+
+                def show_progress():
+                    with live_log.container():
+                        render_job(job)
+
+                run_job(job, on_update=show_progress, **pipeline_args)
+                live_log.empty()
+                collect_job(job)
+        elif not analyze_button:
+            # Returning to an earlier query shows its result without re-running anything;
+            # a query without a result in this session shows none
+            st.session_state["active_result"] = current_key if current_key in views else None
+
+        result_panel()
+
+    with log_area:
+        if job and job["status"] == "running":
+            live_log_panel()
+        elif job:
+            render_job(job)
 
 if __name__ == "__main__":
     main() 
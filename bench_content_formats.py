@@ -0,0 +1,166 @@
+"""Compare the HTML and markdown content-analysis paths.
+
+For each URL the page is scraped twice through Firecrawl (formats=['markdown', 'html']
+as the HTML path does today, and formats=['markdown'] only), then both analyses are
+timed and their metrics compared.
+
+Usage:
+    python bench_content_formats.py URL [URL ...]
+    python bench_content_formats.py --files page.html page.md [--files other.html other.md]
+
+The Firecrawl key is read from FIRECRAWL_API_KEY or Streamlit secrets.
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from typing import Dict, List
+
+from content_analysis import analyze_content, analyze_markdown
+
+ELEMENT_METRICS = ['lists', 'tables', 'images', 'links', 'headings']
+
+
+def _payload_bytes(result) -> int:
+    """Approximate bytes transferred for a scrape response"""
+    return len(json.dumps(result, default=str).encode('utf-8'))
+
+
+def _time_analysis(func, content: str, repeat: int) -> float:
+    """Median seconds of one analysis over `repeat` runs"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(content)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def _flatten_headings(tree: List[Dict]) -> List[str]:
+    texts = []
+    for node in tree:
+        texts.append(f"h{node['level']}:{node['text'].lower()}")
+        texts.extend(_flatten_headings(node['children']))
+    return texts
+
+
+def compare_metrics(html_analysis: Dict, markdown_analysis: Dict) -> Dict:
+    """Metric parity between the two paths (markdown value / HTML value, heading overlap)"""
+    parity = {}
+    html_words = html_analysis.get('word_count', 0)
+    parity['word_count'] = (markdown_analysis.get('word_count', 0), html_words)
+    parity['paragraphs'] = (
+        markdown_analysis.get('content_structure', {}).get('total_paragraphs', 0),
+        html_analysis.get('content_structure', {}).get('total_paragraphs', 0)
+    )
+    for metric in ELEMENT_METRICS:
+        parity[metric] = (
+            markdown_analysis.get('content_elements', {}).get(metric, 0),
+            html_analysis.get('content_elements', {}).get(metric, 0)
+        )
+    html_headings = set(_flatten_headings(html_analysis.get('heading_tree', [])))
+    markdown_headings = set(_flatten_headings(markdown_analysis.get('heading_tree', [])))
+    union = html_headings | markdown_headings
+    parity['heading_overlap'] = round(len(html_headings & markdown_headings) / len(union), 3) if union else 1.0
+    topics_html = set(html_analysis.get('key_topics', []))
+    topics_markdown = set(markdown_analysis.get('key_topics', []))
+    parity['key_topic_overlap'] = round(len(topics_html & topics_markdown) / max(len(topics_html | topics_markdown), 1), 3)
+    return parity
+
+
+def bench_pair(label: str, html: str, markdown: str, html_bytes: int, markdown_bytes: int, repeat: int) -> Dict:
+    html_seconds = _time_analysis(analyze_content, html, repeat)
+    markdown_seconds = _time_analysis(analyze_markdown, markdown, repeat)
+    return {
+        'label': label,
+        'bytes': {'html_path': html_bytes, 'markdown_path': markdown_bytes},
+        'parse_seconds': {'html_path': round(html_seconds, 5), 'markdown_path': round(markdown_seconds, 5)},
+        'parity': compare_metrics(analyze_content(html), analyze_markdown(markdown)),
+    }
+
+
+def bench_urls(urls: List[str], api_key: str, repeat: int) -> List[Dict]:
+    from firecrawl import FirecrawlApp
+
+    firecrawl = FirecrawlApp(api_key=api_key)
+    results = []
+    for url in urls:
+        try:
+            start = time.perf_counter()
+            both = firecrawl.scrape_url(url, params={'formats': ['markdown', 'html']})
+            both_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            markdown_only = firecrawl.scrape_url(url, params={'formats': ['markdown']})
+            markdown_seconds = time.perf_counter() - start
+        except Exception as e:
+            print(f"Error scraping {url}: {str(e)}")
+            continue
+        result = bench_pair(
+            url, both.get('html', ''), markdown_only.get('markdown', ''),
+            _payload_bytes(both), _payload_bytes(markdown_only), repeat
+        )
+        result['scrape_seconds'] = {'html_path': round(both_seconds, 3), 'markdown_path': round(markdown_seconds, 3)}
+        results.append(result)
+    return results
+
+
+def print_report(results: List[Dict]):
+    for result in results:
+        print(f"\n=== {result['label']}")
+        for key in ('bytes', 'scrape_seconds', 'parse_seconds'):
+            if key in result:
+                html_value, markdown_value = result[key]['html_path'], result[key]['markdown_path']
+                ratio = f"{markdown_value / html_value:.2f}x" if html_value else "n/a"
+                print(f"  {key:<15} html={html_value:<12} markdown={markdown_value:<12} markdown/html={ratio}")
+        print("  parity (markdown, html):")
+        for metric, value in result['parity'].items():
+            print(f"    {metric:<18} {value}")
+
+    if len(results) > 1:
+        print("\n=== totals")
+        for key in ('bytes', 'parse_seconds'):
+            html_total = sum(r[key]['html_path'] for r in results)
+            markdown_total = sum(r[key]['markdown_path'] for r in results)
+            print(f"  {key:<15} html={html_total:.5g} markdown={markdown_total:.5g}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HTML vs markdown content analysis")
+    parser.add_argument('urls', nargs='*', help="URLs to scrape with Firecrawl")
+    parser.add_argument('--files', nargs=2, action='append', metavar=('HTML', 'MARKDOWN'),
+                        help="Benchmark a saved HTML/markdown pair instead of scraping")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed runs per analysis (median is reported)")
+    parser.add_argument('--json', help="Also write the raw results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for html_path, markdown_path in args.files or []:
+        with open(html_path, encoding='utf-8') as f:
+            html = f.read()
+        with open(markdown_path, encoding='utf-8') as f:
+            markdown = f.read()
+        results.append(bench_pair(
+            f"{html_path} / {markdown_path}", html, markdown,
+            len(html.encode('utf-8')) + len(markdown.encode('utf-8')), len(markdown.encode('utf-8')), args.repeat
+        ))
+
+    if args.urls:
+        api_key = os.getenv('FIRECRAWL_API_KEY')
+        if not api_key:
+            import streamlit as st
+            api_key = st.secrets["FIRECRAWL_API_KEY"]
+        results.extend(bench_urls(args.urls, api_key, args.repeat))
+
+    if not results:
+        parser.print_help()
+        return
+
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""Topic-cluster plans from a seed query.
+
+Related searches and People Also Ask questions are expanded breadth-first, each query's
+top organic URLs are fetched, and queries whose results overlap are grouped into
+clusters. Each cluster becomes one outline job: the cluster containing the seed is the
+pillar page, the others are supporting articles.
+
+Usage:
+    python clusters.py "seed query" [--depth 2] [--max-queries 30] [--max-calls 20] [--generate N] [--json plan.json]
+"""
+import argparse
+import json
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from og import fetch_search_results, serp_locale_params
+from query_index import normalize_query
+from metering import RunMeter
+from key_pred2 import DEFAULT_MARKET
+
+# Expansion bounds: BFS depth below the seed, queries kept, and billed SerpAPI calls
+CLUSTER_MAX_DEPTH = 2
+CLUSTER_MAX_QUERIES = 30
+CLUSTER_MAX_CALLS = 20
+
+# Children taken from each SERP per source, in SERP order
+CLUSTER_FANOUT = {"related": 4, "paa": 3}
+
+# Queries sharing at least this many of their top organic URLs are served by the same
+# page, so they belong in one article
+MIN_SHARED_URLS = 3
+TOP_URLS = 10
+
+_URL_PREFIX = re.compile(r"^https?://(www\.)?", re.IGNORECASE)
+
+
+def normalize_url(url: str) -> str:
+    """Scheme, 'www.', query string, fragment and trailing slash removed"""
+    return _URL_PREFIX.sub("", url.split("#")[0].split("?")[0]).rstrip("/").lower()
+
+
+def serp_children(serp_data: Dict) -> List[Dict]:
+    """Follow-up queries from related searches and PAA questions"""
+    related = [item.get("query", "") for item in serp_data.get("related_searches", [])]
+    questions = [item.get("question", "") for item in serp_data.get("related_questions", [])]
+    return (
+        [{"query": q, "source": "related"} for q in related if q][:CLUSTER_FANOUT["related"]]
+        + [{"query": q, "source": "paa"} for q in questions if q][:CLUSTER_FANOUT["paa"]]
+    )
+
+
+def expand_topic(seed: str, api_key: str, max_depth: int = CLUSTER_MAX_DEPTH,
+                 max_queries: int = CLUSTER_MAX_QUERIES, max_calls: int = CLUSTER_MAX_CALLS,
+                 locale: str = DEFAULT_MARKET["locale"], max_workers: int = 4,
+                 search_results: Callable = fetch_search_results,
+                 meter: Optional[RunMeter] = None) -> List[Dict]:
+    """Bounded breadth-first expansion over related searches and PAA questions.
+
+    Each level is fetched concurrently. Queries are deduplicated by their normalized
+    form, and responses served from a cache do not count towards max_calls (billed
+    SerpAPI searches). Returns one node per fetched query with its depth, parent,
+    source and top organic URLs.
+    """
+    meter = meter or RunMeter(label=f"clusters: {seed}")
+    locale_params = serp_locale_params(locale)
+    seen = {normalize_query(seed)}
+    nodes = []
+    level = [{"query": seed, "source": "seed", "parent": None}]
+
+    def billed_calls():
+        return meter.providers.get("serpapi", {}).get("calls", 0)
+
+    def fetch(item):
+        try:
+            return item, search_results(item["query"], api_key, TOP_URLS, **locale_params)
+        except Exception as e:
+            print(f"Error fetching SERP for {item['query']}: {str(e)}")
+            return item, None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for depth in range(max_depth + 1):
+            # Assume every fetch is billed so concurrent requests cannot overshoot the budget
+            level = level[:max(0, min(max_calls - billed_calls(), max_queries - len(nodes)))]
+            if not level:
+                break
+            next_level = []
+            for item, serp_data in pool.map(fetch, level):
+                if not serp_data:
+                    continue
+                meter.record_serp(serp_data)
+                nodes.append({
+                    **item,
+                    "depth": depth,
+                    "urls": [normalize_url(r["link"]) for r in serp_data.get("organic_results", [])[:TOP_URLS] if r.get("link")],
+                })
+                for child in serp_children(serp_data):
+                    key = normalize_query(child["query"])
+                    if key and key not in seen:
+                        seen.add(key)
+                        next_level.append({**child, "parent": item["query"]})
+            level = next_level
+    print(f"Expanded {seed!r} to {len(nodes)} queries with {billed_calls()} billed SERP calls")
+    return nodes
+
+
+class _DisjointSet:
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+
+    def find(self, i: int) -> int:
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, a: int, b: int):
+        self.parent[self.find(a)] = self.find(b)
+
+
+def cluster_queries(nodes: List[Dict], min_shared: int = MIN_SHARED_URLS) -> List[Dict]:
+    """Group queries whose top URLs overlap by at least min_shared (transitively).
+
+    Shared-URL counts come from an inverted URL -> queries index, so only pairs that
+    share a URL are ever compared. Clusters are returned largest first; the hub (the
+    query overlapping most others, then the shallowest and shortest) leads each one.
+    """
+    postings: Dict[str, List[int]] = {}
+    for i, node in enumerate(nodes):
+        for url in set(node["urls"]):
+            postings.setdefault(url, []).append(i)
+
+    disjoint = _DisjointSet(len(nodes))
+    degree = Counter()
+    for i, node in enumerate(nodes):
+        shared = Counter(j for url in set(node["urls"]) for j in postings[url] if j > i)
+        for j, count in shared.items():
+            if count >= min_shared:
+                disjoint.union(i, j)
+                degree[i] += 1
+                degree[j] += 1
+
+    groups: Dict[int, List[int]] = {}
+    for i in range(len(nodes)):
+        groups.setdefault(disjoint.find(i), []).append(i)
+
+    clusters = []
+    for members in groups.values():
+        members.sort(key=lambda i: (-degree[i], nodes[i]["depth"], len(nodes[i]["query"])))
+        url_counts = Counter(url for i in members for url in set(nodes[i]["urls"]))
+        clusters.append({
+            "hub": nodes[members[0]]["query"],
+            "queries": [nodes[i]["query"] for i in members],
+            "sources": {nodes[i]["query"]: nodes[i]["source"] for i in members},
+            "shared_urls": [url for url, count in url_counts.most_common(5) if count > 1],
+        })
+    clusters.sort(key=lambda cluster: -len(cluster["queries"]))
+    return clusters
+
+
+def outline_jobs(seed: str, clusters: List[Dict]) -> List[Dict]:
+    """One outline job per cluster: the seed's cluster is the pillar, the rest support it"""
+    jobs = []
+    for cluster in clusters:
+        is_pillar = seed in cluster["queries"]
+        jobs.append({
+            "query": seed if is_pillar else cluster["hub"],
+            "role": "pillar" if is_pillar else "cluster",
+            "related_queries": [q for q in cluster["queries"] if q != (seed if is_pillar else cluster["hub"])],
+        })
+    jobs.sort(key=lambda job: job["role"] != "pillar")
+    return jobs
+
+
+def plan_clusters(seed: str, api_key: str, **expand_options) -> Dict:
+    nodes = expand_topic(seed, api_key, **expand_options)
+    clusters = cluster_queries(nodes)
+    return {"seed": seed, "queries": len(nodes), "clusters": clusters, "jobs": outline_jobs(seed, clusters)}
+
+
+def main():
+    from config import load_config
+    from outline_store import OutlineStore
+    from pipeline import generate_outline, api_keys_from_config
+
+    parser = argparse.ArgumentParser(description="Plan a pillar/cluster content set from a seed query")
+    parser.add_argument("seed")
+    parser.add_argument("--depth", type=int, default=CLUSTER_MAX_DEPTH)
+    parser.add_argument("--max-queries", type=int, default=CLUSTER_MAX_QUERIES)
+    parser.add_argument("--max-calls", type=int, default=CLUSTER_MAX_CALLS, help="Billed SerpAPI calls for the expansion")
+    parser.add_argument("--generate", type=int, default=0, metavar="N", help="Generate and store outlines for the first N jobs")
+    parser.add_argument("--json", help="Write the plan to this file")
+    args = parser.parse_args()
+
+    config = load_config()
+    meter = RunMeter(label=f"clusters: {args.seed}")
+    plan = plan_clusters(args.seed, config["SERPAPI_KEY"], max_depth=args.depth,
+                         max_queries=args.max_queries, max_calls=args.max_calls, meter=meter)
+    meter.finish()
+
+    for job in plan["jobs"]:
+        print(f"[{job['role']}] {job['query']}")
+        for query in job["related_queries"]:
+            print(f"    - {query}")
+
+    if args.generate:
+        store = OutlineStore(config["OUTLINE_STORE_PATH"])
+        api_keys = api_keys_from_config(config)
+        for job in plan["jobs"][:args.generate]:
+            try:
+                result = generate_outline(job["query"], api_keys, search_results=fetch_search_results)
+                job["outline_id"] = store.append(result)
+            except Exception as e:
+                print(f"Error generating outline for {job['query']}: {str(e)}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(plan, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import os
+from typing import Dict
+
+from dotenv import load_dotenv
+
+# Load environment variables (.env is optional)
+load_dotenv()
+
+SECRET_NAMES = ("MOZ_API_TOKEN", "OPENAI_API_KEY", "FIRECRAWL_API_KEY", "SERPAPI_KEY")
+
+# Non-secret settings and their defaults; each can be overridden by an environment variable
+SETTINGS = {
+    "OUTLINE_STORE_PATH": "outlines.db",
+    "API_MAX_CONCURRENT_OUTLINES": 4,   # full pipeline runs in flight per API process
+    "API_MAX_CONCURRENT_REQUESTS": 16,  # keyword/SERP requests in flight per API process
+    "API_QUEUE_TIMEOUT": 10.0,          # seconds a request waits for a slot before 503
+    "RUN_BUDGET_USD": 1.0,              # spend cap for one outline run
+    "HOURLY_BUDGET_USD": 20.0,          # spend cap per clock hour, per process
+    "RESPONSE_CACHE_PATH": "outlines.db",  # persistent provider response cache; empty disables it
+    "USAGE_LOG_PATH": "usage.jsonl",    # per-run usage records (see metering.py)
+    "PROVIDER_RECORDING": "",           # 'record' or 'replay' provider calls (see replay.py)
+    "PROVIDER_ARCHIVE": "provider_calls.jsonl.gz",
+    "REPLAY_LATENCY_SCALE": 1.0,        # replayed latency factor; 0 serves responses immediately
+    "CONTENT_FORMAT": "html",           # competitor content analyzed: 'html' or 'markdown' (see og.py)
+    "OUTLINE_GENERATION": "single",     # outline as one completion or as parallel 'sections' (see og.py)
+    "LLM_HEDGE_WORKERS": 16,            # threads for hedged LLM calls; calls beyond this are not hedged
+}
+
+
+def _streamlit_secret(name: str):
+    """Read a Streamlit secret if Streamlit and a secrets file are available"""
+    try:
+        import streamlit as st
+        return st.secrets[name]
+    except Exception:
+        return None
+
+
+def get_secret(name: str, default: str = None) -> str:
+    """Secret from the environment (or .env), falling back to Streamlit secrets"""
+    value = os.getenv(name)
+    if value:
+        return value
+    value = _streamlit_secret(name)
+    return value if value else default
+
+
+def get_setting(name: str):
+    """Setting from the environment, typed like its default in SETTINGS"""
+    default = SETTINGS[name]
+    value = os.getenv(name)
+    return type(default)(value) if value is not None else default
+
+
+def load_config() -> Dict:
+    """All secrets and settings, typed like their defaults"""
+    config = {name: get_secret(name) for name in SECRET_NAMES}
+    for name in SETTINGS:
+        config[name] = get_setting(name)
+    return config
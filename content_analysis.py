@@ -0,0 +1,235 @@
+import re
+from collections import Counter
+from typing import Dict, List
+
+from bs4 import BeautifulSoup
+
+
+def analyze_content(content: str) -> Dict:
+    """Analyze scraped content for insights"""
+    try:
+        soup = BeautifulSoup(content, 'html.parser')
+        text_content = soup.get_text() or content
+        # Collect heading tags once; they feed both the counts and the outline tree
+        heading_tags = soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
+
+        analysis = {
+            'word_count': len(text_content.split()),
+            'common_phrases': extract_common_phrases(text_content),
+            'content_structure': analyze_content_structure(text_content),
+            'key_topics': extract_key_topics(text_content),
+            'content_elements': identify_content_elements(content, soup=soup, heading_tags=heading_tags),
+            'heading_tree': extract_heading_tree(
+                (int(tag.name[1]), tag.get_text(' ', strip=True)) for tag in heading_tags
+            )
+        }
+        return analysis
+    except Exception as e:
+        print(f"Error in content analysis: {str(e)}")
+        return {}
+
+
+def extract_common_phrases(text_content: str) -> List[str]:
+    """Extract common phrases from text content"""
+    try:
+        # Basic phrase extraction using regex
+        phrases = re.findall(r'\b[\w\s]{10,30}\b', text_content.lower())
+        # Count and return most common phrases
+        phrase_counter = Counter(phrases)
+        return [phrase for phrase, count in phrase_counter.most_common(10)]
+    except Exception as e:
+        print(f"Error extracting common phrases: {str(e)}")
+        return []
+
+
+def analyze_content_structure(text_content: str) -> Dict:
+    """Analyze content structure including headings and sections"""
+    try:
+        # Basic structure analysis
+        paragraphs = text_content.split('\n\n')
+        structure = {
+            'total_paragraphs': len(paragraphs),
+            'avg_paragraph_length': sum(len(p.split()) for p in paragraphs) / len(paragraphs) if paragraphs else 0,
+        }
+        return structure
+    except Exception as e:
+        print(f"Error analyzing content structure: {str(e)}")
+        return {}
+
+
+def extract_key_topics(text_content: str) -> List[str]:
+    """Extract key topics from content"""
+    try:
+        # Simple keyword extraction
+        words = re.findall(r'\b\w+\b', text_content.lower())
+        # Filter common words and get most frequent
+        word_counter = Counter(words)
+        return [word for word, count in word_counter.most_common(10)]
+    except Exception as e:
+        print(f"Error extracting key topics: {str(e)}")
+        return []
+
+
+def identify_content_elements(content: str, soup: BeautifulSoup = None, heading_tags: List = None) -> Dict:
+    """Identify various content elements like lists, tables, etc."""
+    try:
+        if soup is None:
+            soup = BeautifulSoup(content, 'html.parser')
+        if heading_tags is None:
+            heading_tags = soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
+        elements = {
+            'lists': len(soup.find_all(['ul', 'ol'])),
+            'tables': len(soup.find_all('table')),
+            'images': len(soup.find_all('img')),
+            'links': len(soup.find_all('a')),
+            'headings': len(heading_tags)
+        }
+        return elements
+    except Exception as e:
+        print(f"Error identifying content elements: {str(e)}")
+        return {}
+
+
+def extract_heading_tree(headings, max_level: int = 4) -> List[Dict]:
+    """Build a nested H1-H4 outline from (level, text) pairs in document order"""
+    try:
+        tree = []
+        stack = []  # open nodes, shallowest first
+        for level, text in headings:
+            text = ' '.join(text.split())[:120]
+            if level > max_level or not text:
+                continue
+            node = {'level': level, 'text': text, 'children': []}
+            while stack and stack[-1]['level'] >= level:
+                stack.pop()
+            (stack[-1]['children'] if stack else tree).append(node)
+            stack.append(node)
+        return tree
+    except Exception as e:
+        print(f"Error extracting heading tree: {str(e)}")
+        return []
+
+
+_MD_FENCE = re.compile(r'^\s*(```|~~~)')
+_MD_ATX_HEADING = re.compile(r'^\s{0,3}(#{1,6})\s+(.*?)(?:\s+#+)?\s*$')
+_MD_SETEXT_UNDERLINE = re.compile(r'^\s{0,3}(=+|-+)\s*$')
+_MD_LIST_ITEM = re.compile(r'^(\s*)(?:[-*+]|\d+[.)])\s+')
+_MD_TABLE_SEPARATOR = re.compile(r'^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)+\|?\s*$')
+_MD_IMAGE = re.compile(r'!\[[^\]]*\]\([^)]*\)')
+_MD_LINK = re.compile(r'\[([^\]]*)\]\([^)]*\)')
+_MD_AUTOLINK = re.compile(r'<(?:https?|mailto):[^>\s]+>')
+_MD_HTML_TAG = re.compile(r'<[^>]+>')
+_MD_INLINE_MARKS = re.compile(r'[*_`~]+')
+_MD_BLOCKQUOTE = re.compile(r'^\s*(>\s?)+')
+
+
+def _markdown_plain_text(line: str) -> str:
+    """Visible text of one markdown line (images dropped, links reduced to their text)"""
+    line = _MD_IMAGE.sub(' ', line)
+    line = _MD_LINK.sub(r'\1', line)
+    line = _MD_AUTOLINK.sub(' ', line)
+    line = _MD_HTML_TAG.sub(' ', line)
+    line = _MD_BLOCKQUOTE.sub('', line)
+    line = _MD_LIST_ITEM.sub('', line)
+    line = line.replace('|', ' ')
+    return _MD_INLINE_MARKS.sub('', line).strip()
+
+
+def scan_markdown(markdown: str) -> Dict:
+    """Single line-oriented pass over markdown.
+
+    Returns the visible text, element counts matching identify_content_elements() and
+    the (level, text) headings in document order.
+    """
+    elements = {'lists': 0, 'tables': 0, 'images': 0, 'links': 0, 'headings': 0}
+    headings = []
+    text_lines = []
+    in_code = False
+    in_table = False
+    list_indents = []  # indentation of the open (nested) lists
+    after_blank = False
+    previous_text = None  # candidate setext heading text
+
+    for line in markdown.splitlines():
+        if _MD_FENCE.match(line):
+            in_code = not in_code
+            continue
+        if in_code:
+            text_lines.append(line)
+            continue
+
+        stripped = line.strip()
+        if not stripped:
+            in_table = False
+            after_blank = True
+            previous_text = None
+            text_lines.append('')
+            continue
+
+        elements['images'] += len(_MD_IMAGE.findall(line))
+        elements['links'] += len(_MD_LINK.findall(_MD_IMAGE.sub(' ', line))) + len(_MD_AUTOLINK.findall(line))
+
+        heading = _MD_ATX_HEADING.match(line)
+        if heading:
+            text = _markdown_plain_text(heading.group(2))
+            headings.append((len(heading.group(1)), text))
+            text_lines.append(text)
+            list_indents, previous_text, after_blank = [], None, False
+            continue
+
+        if previous_text and not list_indents and not in_table and _MD_SETEXT_UNDERLINE.match(line):
+            headings.append((1 if stripped[0] == '=' else 2, previous_text))
+            previous_text = None
+            continue
+
+        if '|' in line and _MD_TABLE_SEPARATOR.match(line):
+            if not in_table:
+                elements['tables'] += 1
+                in_table = True
+            previous_text = None
+            continue
+
+        item = _MD_LIST_ITEM.match(line)
+        if item:
+            indent = len(item.group(1).expandtabs(4))
+            while list_indents and indent < list_indents[-1]:
+                list_indents.pop()
+            if not list_indents or indent > list_indents[-1]:
+                elements['lists'] += 1
+                list_indents.append(indent)
+        elif after_blank and not line[:1].isspace():
+            list_indents = []
+
+        text = _markdown_plain_text(line)
+        text_lines.append(text)
+        previous_text = text if not item and not in_table and '|' not in line else None
+        after_blank = False
+
+    elements['headings'] = len(headings)
+    return {'text': '\n'.join(text_lines), 'elements': elements, 'headings': headings}
+
+
+def analyze_markdown(markdown: str) -> Dict:
+    """Analyze scraped markdown without an HTML parse; same keys as analyze_content()"""
+    try:
+        scanned = scan_markdown(markdown)
+        text_content = scanned['text']
+        analysis = {
+            'word_count': len(text_content.split()),
+            'common_phrases': extract_common_phrases(text_content),
+            'content_structure': analyze_content_structure(text_content),
+            'key_topics': extract_key_topics(text_content),
+            'content_elements': scanned['elements'],
+            'heading_tree': extract_heading_tree(scanned['headings'])
+        }
+        return analysis
+    except Exception as e:
+        print(f"Error in markdown analysis: {str(e)}")
+        return {}
+
+
+def analyze_document(content: str, content_format: str = 'html') -> Dict:
+    """Analyze content scraped in the given format ('html' or 'markdown')"""
+    if content_format == 'markdown':
+        return analyze_markdown(content)
+    return analyze_content(content)
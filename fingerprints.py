@@ -0,0 +1,150 @@
+import hashlib
+import json
+import re
+import sqlite3
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from config import get_setting
+from sqlite_store import SQLiteStore
+
+# Pages whose SimHashes differ in at most this many of 64 bits are near-duplicates
+MAX_HAMMING_DISTANCE = 3
+
+# Words per shingle
+SHINGLE_SIZE = 3
+
+# 64-bit fingerprints are split into 4 bands of 16 bits; two fingerprints within
+# MAX_HAMMING_DISTANCE (< 4) of each other always agree on at least one band.
+_BANDS = 4
+_BAND_BITS = 64 // _BANDS
+
+_TAG = re.compile(r"<script.*?</script>|<style.*?</style>|<[^>]+>", re.IGNORECASE | re.DOTALL)
+_WORD = re.compile(r"\w+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS page_fingerprints (
+    url TEXT PRIMARY KEY,
+    simhash INTEGER NOT NULL,
+    band0 INTEGER NOT NULL,
+    band1 INTEGER NOT NULL,
+    band2 INTEGER NOT NULL,
+    band3 INTEGER NOT NULL,
+    word_count INTEGER,
+    analysis TEXT,
+    seen_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_fp_band0 ON page_fingerprints(band0);
+CREATE INDEX IF NOT EXISTS idx_fp_band1 ON page_fingerprints(band1);
+CREATE INDEX IF NOT EXISTS idx_fp_band2 ON page_fingerprints(band2);
+CREATE INDEX IF NOT EXISTS idx_fp_band3 ON page_fingerprints(band3);
+"""
+
+
+def fingerprint_text(content: str) -> str:
+    """Cheap visible-text approximation (no HTML parse) used only for fingerprinting"""
+    if "<" in content and ">" in content:
+        content = _TAG.sub(" ", content)
+    return content
+
+
+def simhash(text: str, shingle_size: int = SHINGLE_SIZE) -> int:
+    """64-bit SimHash over word shingles"""
+    words = _WORD.findall(text.lower())
+    if len(words) < shingle_size:
+        shingles = Counter([" ".join(words)]) if words else Counter()
+    else:
+        shingles = Counter(" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1))
+
+    weights = [0] * 64
+    for shingle, count in shingles.items():
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+        for bit in range(64):
+            weights[bit] += count if value >> bit & 1 else -count
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def is_near_duplicate(a: int, b: int, max_distance: int = MAX_HAMMING_DISTANCE) -> bool:
+    return hamming_distance(a, b) <= max_distance
+
+
+def _to_signed(value: int) -> int:
+    """SQLite integers are signed 64-bit"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+def _bands(fingerprint: int) -> List[int]:
+    mask = (1 << _BAND_BITS) - 1
+    return [(fingerprint >> (i * _BAND_BITS)) & mask for i in range(_BANDS)]
+
+
+class FingerprintStore(SQLiteStore):
+    """Persistent SimHash fingerprints of scraped pages, with their content analysis"""
+
+    def __init__(self, path: Optional[str] = None):
+        super().__init__(path or get_setting("OUTLINE_STORE_PATH"), SCHEMA)
+
+    def _decode(self, row: sqlite3.Row) -> Dict:
+        return {
+            "url": row["url"],
+            "simhash": _to_unsigned(row["simhash"]),
+            "word_count": row["word_count"],
+            "analysis": json.loads(row["analysis"]) if row["analysis"] else None,
+            "seen_at": row["seen_at"],
+        }
+
+    def get_many(self, urls: List[str]) -> Dict[str, Dict]:
+        """Stored fingerprints for the given URLs"""
+        if not urls:
+            return {}
+        placeholders = ",".join("?" for _ in urls)
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT * FROM page_fingerprints WHERE url IN ({placeholders})", list(urls)).fetchall()
+        return {row["url"]: self._decode(row) for row in rows}
+
+    def find_near(self, fingerprint: int, max_distance: int = MAX_HAMMING_DISTANCE,
+                  exclude_url: Optional[str] = None) -> List[Dict]:
+        """Stored pages within max_distance bits of the fingerprint, closest first"""
+        bands = _bands(fingerprint)
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM page_fingerprints WHERE band0 = ? OR band1 = ? OR band2 = ? OR band3 = ?",
+                bands
+            ).fetchall()
+        matches = []
+        for row in rows:
+            record = self._decode(row)
+            if record["url"] == exclude_url:
+                continue
+            distance = hamming_distance(fingerprint, record["simhash"])
+            if distance <= max_distance:
+                record["distance"] = distance
+                matches.append(record)
+        return sorted(matches, key=lambda record: record["distance"])
+
+    def put(self, url: str, fingerprint: int, word_count: Optional[int] = None, analysis: Optional[Dict] = None):
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO page_fingerprints "
+                "(url, simhash, band0, band1, band2, band3, word_count, analysis, seen_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [url, _to_signed(fingerprint)] + _bands(fingerprint) + [
+                    word_count,
+                    json.dumps(analysis) if analysis is not None else None,
+                    datetime.now().isoformat(timespec="seconds"),
+                ]
+            )
@@ -1,16 +1,20 @@
 import json
+import re
+import threading
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from openai import OpenAI
-from dotenv import load_dotenv
 import os
-import streamlit as st  # Use Streamlit secrets
+from llm_client import create_chat_completion
+from keyword_selector import select_keywords
+from config import get_secret
+from replay import provider_call
+from response_cache import get_response_cache
 
-# Load environment variables
-load_dotenv()
-
-# Get API keys from environment variables
-MOZ_API_TOKEN = st.secrets["MOZ_API_TOKEN"]
-OPENAI_API_KEY = st.secrets["OPENAI_API_KEY"]
+# Get API keys from the environment, .env or Streamlit secrets
+MOZ_API_TOKEN = get_secret("MOZ_API_TOKEN")
+OPENAI_API_KEY = get_secret("OPENAI_API_KEY")
 
 # API Headers
 HEADERS = {
@@ -18,99 +22,366 @@ HEADERS = {
     "Content-Type": "application/json",
 }
 
-def get_suggested_keywords(search_query):
-    """Fetch suggested keywords from Moz API."""
+# Default market used when no locale/device is given
+DEFAULT_MARKET = {"locale": "en-US", "device": "desktop", "engine": "google"}
+
+# Markets offered for multi-market keyword expansion
+MARKET_PRESETS = [
+    {"locale": "en-US", "device": "desktop", "engine": "google"},
+    {"locale": "en-US", "device": "mobile", "engine": "google"},
+    {"locale": "en-GB", "device": "desktop", "engine": "google"},
+    {"locale": "en-CA", "device": "desktop", "engine": "google"},
+    {"locale": "en-AU", "device": "desktop", "engine": "google"},
+    {"locale": "de-DE", "device": "desktop", "engine": "google"},
+    {"locale": "fr-FR", "device": "desktop", "engine": "google"},
+    {"locale": "es-ES", "device": "desktop", "engine": "google"},
+]
+
+# Pooled session shared by all Moz requests (keep-alive across concurrent lookups)
+SESSION = requests.Session()
+SESSION.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
+# In-process cache of Moz responses keyed by (method, keyword, locale, device, engine)
+MOZ_CACHE_TTL = 6 * 3600
+_moz_cache = {}
+_moz_cache_lock = threading.Lock()
+
+
+def market_label(market):
+    """Short label for a market, e.g. 'en-US/desktop'."""
+    return f"{market.get('locale', DEFAULT_MARKET['locale'])}/{market.get('device', DEFAULT_MARKET['device'])}"
+
+
+def _moz_request(method, keyword, locale, device, engine, request_id, meter=None):
+    """POST a Moz JSON-RPC request, caching successful and 'no data' responses.
+
+    Responses are cached in-process and in the persistent response cache (which the
+    prefetch scheduler warms). Returns (status_code, payload) where payload is the
+    decoded JSON or the error text. When a metering.RunMeter is given, the call (or
+    cache hit) is recorded on it.
+    """
+    cache_key = (method, keyword.lower(), locale, device, engine)
+    with _moz_cache_lock:
+        cached = _moz_cache.get(cache_key)
+    if cached and time.time() - cached[0] < MOZ_CACHE_TTL:
+        if meter:
+            meter.record("moz", cached=True)
+        return cached[1]
+
     data = {
         "jsonrpc": "2.0",
-        "id": "a825164-a0be-44f8-9c68-02f90f49093b",
-        "method": "data.keyword.suggestions.list",
+        "id": request_id,
+        "method": method,
         "params": {
             "data": {
                 "serp_query": {
-                    "keyword": search_query,
-                    "locale": "en-US",
-                    "device": "desktop",
-                    "engine": "google"
+                    "keyword": keyword,
+                    "locale": locale,
+                    "device": device,
+                    "engine": engine
                 }
             }
         }
     }
+
+    # Recording, replay and cache key: suggestions and metrics share the same params, so
+    # the JSON-RPC method must be part of it (the request id is not: it is random)
+    request = {"method": method, **data["params"]}
+    response_cache = get_response_cache()
+    stored = response_cache.get("moz", request) if response_cache else None
+    if stored:
+        result = tuple(stored)
+        if meter:
+            meter.record("moz", cached=True)
+    else:
+        def post():
+            response = SESSION.post("https://api.moz.com/jsonrpc", headers=HEADERS, data=json.dumps(data))
+            if response.status_code == 200:
+                return 200, response.json()
+            return response.status_code, response.text
+
+        if meter:
+            meter.acquire("moz")
+        status, payload = provider_call("moz", request, post, errors=(requests.exceptions.RequestException,))
+        result = (status, payload)
+        if meter:
+            meter.record("moz")
+        if response_cache and status in (200, 404):
+            response_cache.put("moz", request, result)
+
+    if result[0] in (200, 404):
+        with _moz_cache_lock:
+            _moz_cache[cache_key] = (time.time(), result)
+    return result
+
+
+def get_suggested_keywords(search_query, locale="en-US", device="desktop", engine="google", meter=None):
+    """Fetch suggested keywords from Moz API."""
+    status, payload = _moz_request(
+        "data.keyword.suggestions.list", search_query, locale, device, engine,
+        "a825164-a0be-44f8-9c68-02f90f49093b", meter
+    )
     
-    response = requests.post("https://api.moz.com/jsonrpc", headers=HEADERS, data=json.dumps(data))
-    
-    if response.status_code == 200:
-        result = response.json()
-        return result.get("result", {}).get("suggestions", [])
+    if status == 200:
+        return payload.get("result", {}).get("suggestions", [])
     else:
-        print(f"❌ Error {response.status_code}: {response.text}")
+        print(f"❌ Error {status}: {payload}")
         return []
 
-def get_keyword_metrics(keyword):
+def get_keyword_metrics(keyword, locale="en-US", device="desktop", engine="google", meter=None):
     """Fetch keyword metrics from Moz API."""
-    data = {
-        "jsonrpc": "2.0",
-        "id": "285a801c-b526-4d69-8566-dd8442700639",
-        "method": "data.keyword.metrics.fetch",
-        "params": {
-            "data": {
-                "serp_query": {
-                    "keyword": keyword,
-                    "locale": "en-US",
-                    "device": "desktop",
-                    "engine": "google"
-                }
-            }
-        }
-    }
-    
-    response = requests.post("https://api.moz.com/jsonrpc", headers=HEADERS, data=json.dumps(data))
+    status, payload = _moz_request(
+        "data.keyword.metrics.fetch", keyword, locale, device, engine,
+        "285a801c-b526-4d69-8566-dd8442700639", meter
+    )
     
-    if response.status_code == 200:
-        result = response.json()
-        return result.get("result", {}).get("keyword_metrics", {})
-    elif response.status_code == 404:
+    if status == 200:
+        return payload.get("result", {}).get("keyword_metrics", {})
+    elif status == 404:
         print(f"⚠️ No data for: {keyword} (Skipping)")
         return None  # No data for this keyword
     else:
-        print(f"❌ Error {response.status_code}: {response.text}")
+        print(f"❌ Error {status}: {payload}")
         return {}
 
-def analyze_keywords(primary_keyword, keywords_data):
-    """Use OpenAI to analyze keywords and suggest secondary ones."""
-    client = OpenAI(api_key=OPENAI_API_KEY)
-    
-    system_prompt = (
-    "You are an expert in SEO and keyword analysis. "
-    "Given a list of suggested keywords and their metrics, determine the primary keyword and three relevant secondary keywords. " 
-
-    "- The primary keyword is the main search query that best represents the user's intent. "
-    "- The secondary keywords should complement the primary keyword, enhance content optimization, and improve search ranking. "
-    "- If a suggested secondary keyword is irrelevant, redundant, or suboptimal, replace it with a more suitable one based on your SEO expertise. "
-    "- If none of the suggested secondary keywords are appropriate, generate three entirely new secondary keywords that align with the primary keyword's intent and search ranking potential. "
-    "- Predict three secondary keywords for the primary keyword based on your expertise, then compare them with the secondary keywords suggested by Moz (/keyword_data) and select the better/more relevant ones. "
-    "- The content intent should be one of: informational, commercial, transactional, or navigational. "
-    "- Do not include numbers (e.g., 2025, top 10, best 5) or dates in the primary or secondary keywords. If any suggested keyword contains numbers or dates, replace it with a more appropriate alternative. "
-
-    "Format the output exactly as follows (maintain the exact format):"
-
-    "Primary keyword: <primary_keyword>"
-    "Secondary keywords: <keyword1>, <keyword2>, <keyword3>"
+
+def _metrics_entry(metrics):
+    return {
+        "volume": metrics.get("volume", "N/A"),
+        "difficulty": metrics.get("difficulty", "N/A"),
+        "organic_ctr": metrics.get("organic_ctr", "N/A"),
+        "priority": metrics.get("priority", "N/A"),
+    }
+
+
+def _numbers(values):
+    return [v for v in values if isinstance(v, (int, float)) and not isinstance(v, bool)]
+
+
+def expand_keywords_for_markets(search_query, markets=None, limit=10, max_workers=6, meter=None):
+    """Fetch suggestions and metrics for several locale/device markets concurrently.
+
+    Suggestion lookups for all markets run in parallel and metric lookups for a market
+    start as soon as its suggestions arrive, so wall time stays close to a single
+    market's. Returns merged rows with a per-market "markets" dict plus aggregate
+    volume (sum), difficulty (max), organic_ctr and priority (mean), which makes them
+    usable as keywords_data for analyze_keywords(). Moz calls are recorded on meter.
+    """
+    markets = [{**DEFAULT_MARKET, **m} for m in (markets or [DEFAULT_MARKET])]
+    merged = {}
+    order = []
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        suggestion_futures = {
+            pool.submit(get_suggested_keywords, search_query, m["locale"], m["device"], m["engine"], meter): m
+            for m in markets
+        }
+        metric_futures = {}
+        for future in as_completed(suggestion_futures):
+            market = suggestion_futures[future]
+            try:
+                suggestions = future.result()
+            except Exception as e:
+                print(f"❌ Suggestions failed for {market_label(market)}: {str(e)}")
+                continue
+
+            seen_keywords = set()
+            for position, suggestion in enumerate(suggestions[:limit]):
+                keyword_text = suggestion["keyword"].strip()
+                if keyword_text.lower() in seen_keywords:
+                    continue
+                seen_keywords.add(keyword_text.lower())
+                metric_futures[pool.submit(
+                    get_keyword_metrics, keyword_text, market["locale"], market["device"], market["engine"], meter
+                )] = (keyword_text, market, position)
+
+        for future in as_completed(metric_futures):
+            keyword_text, market, _ = metric_futures[future]
+            try:
+                metrics = future.result()
+            except Exception as e:
+                print(f"❌ Metrics failed for {keyword_text} ({market_label(market)}): {str(e)}")
+                continue
+            if metrics is None:
+                continue
+            key = keyword_text.lower()
+            if key not in merged:
+                merged[key] = {"keyword": keyword_text, "markets": {}}
+                order.append(key)
+            merged[key]["markets"][market_label(market)] = _metrics_entry(metrics)
+
+    # Order rows by market priority, then by Moz suggestion order within the market
+    rank = {}
+    for keyword_text, market, position in metric_futures.values():
+        key = keyword_text.lower()
+        rank[key] = min(rank.get(key, (len(markets), 0)), (markets.index(market), position))
+
+    rows = []
+    for key in sorted(order, key=lambda k: rank[k]):
+        row = merged[key]
+        per_market = row["markets"].values()
+        volumes = _numbers(m["volume"] for m in per_market)
+        difficulties = _numbers(m["difficulty"] for m in per_market)
+        ctrs = _numbers(m["organic_ctr"] for m in per_market)
+        priorities = _numbers(m["priority"] for m in per_market)
+        rows.append({
+            "keyword": row["keyword"],
+            "volume": sum(volumes) if volumes else "N/A",
+            "difficulty": max(difficulties) if difficulties else "N/A",
+            "organic_ctr": round(sum(ctrs) / len(ctrs), 2) if ctrs else "N/A",
+            "priority": round(sum(priorities) / len(priorities), 2) if priorities else "N/A",
+            "markets": row["markets"],
+        })
+    return rows
+
+# Call policy for the keyword-analysis completion (see llm_client.LLM_CALL_DEFAULTS)
+KEYWORD_ANALYSIS_CALL_OPTIONS = {
+    "timeout": 30.0,
+    "deadline": 90.0,
+    "hedge": True,
+}
+
+# Model routing for keyword analysis: the small classification task goes to the
+# fast model first and escalates to the larger one only if the output is malformed.
+KEYWORD_ANALYSIS_ROUTE = {
+    "model": "gpt-4o-mini",
+    "escalation_model": "gpt-4",
+    "max_tokens": 120,
+}
+
+# Local keyword selection (keyword_selector) in front of the LLM:
+#   "llm"   - always ask the LLM
+#   "local" - never ask the LLM
+#   "auto"  - use the local result when its confidence reaches min_confidence
+KEYWORD_SELECTION = {
+    "mode": "auto",
+    "min_confidence": 0.7,
+}
+
+CONTENT_INTENTS = ("informational", "commercial", "transactional", "navigational")
+
+KEYWORD_ANALYSIS_PROMPT = (
+    "You are an SEO keyword analyst. From the keyword rows (keyword|volume|difficulty|organic_ctr|priority), "
+    "pick the primary keyword that best matches the user's intent and three secondary keywords that complement it. "
+    "Replace irrelevant, redundant or weak suggestions with better ones from your own expertise. "
+    "Keywords must not contain numbers or dates (e.g. 2025, top 10). "
+    "Intent is one of: informational, commercial, transactional, navigational.\n"
+    "Reply with exactly these three lines and nothing else:\n"
+    "Primary keyword: <primary_keyword>\n"
+    "Secondary keywords: <keyword1>, <keyword2>, <keyword3>\n"
     "Intent: <content_intent>"
 )
 
+_ANALYSIS_LINE = re.compile(r"^\s*\**\s*(primary keyword|secondary keywords|intent)\s*\**\s*:\s*\**\s*(.*?)\s*\**\s*$", re.IGNORECASE)
 
-    
-    user_prompt = f"Primary keyword: {primary_keyword}\nHere is the keyword data:\n{json.dumps(keywords_data, indent=2)}\n\nIdentify three secondary keywords."
-    
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
+
+def compact_keyword_rows(keywords_data):
+    """Serialize keyword rows as one pipe-separated line each (no JSON keys or indentation)."""
+    lines = []
+    for row in keywords_data:
+        lines.append("|".join(
+            str(row.get(field, "N/A"))
+            for field in ("keyword", "volume", "difficulty", "organic_ctr", "priority")
+        ))
+    return "\n".join(lines)
+
+
+def parse_keyword_analysis(text):
+    """Parse the strict keyword-analysis format.
+
+    Returns a dict with primary_keyword, secondary_keywords (up to three; the local
+    selector may find fewer) and intent, or None if the text does not match the
+    expected format.
+    """
+    if not text:
+        return None
+    fields = {}
+    for line in text.splitlines():
+        match = _ANALYSIS_LINE.match(line)
+        if match:
+            fields.setdefault(match.group(1).lower(), match.group(2).strip().strip('"'))
+    if len(fields) != 3:
+        return None
+
+    primary_keyword = fields["primary keyword"]
+    secondary_keywords = [k.strip().strip('"') for k in fields["secondary keywords"].split(",") if k.strip()]
+    intent = fields["intent"].lower().rstrip(".")
+    if not primary_keyword or len(secondary_keywords) > 3 or intent not in CONTENT_INTENTS:
+        return None
+    return {
+        "primary_keyword": primary_keyword,
+        "secondary_keywords": secondary_keywords,
+        "intent": intent,
+    }
+
+
+def format_keyword_analysis(parsed):
+    """Render a parsed keyword analysis back into the canonical three-line format."""
+    return (
+        f"Primary keyword: {parsed['primary_keyword']}\n"
+        f"Secondary keywords: {', '.join(parsed['secondary_keywords'])}\n"
+        f"Intent: {parsed['intent']}"
     )
-    
-    return response.choices[0].message.content
+
+
+def analyze_keywords(primary_keyword, keywords_data, route=None, selection=None, on_usage=None):
+    """Use OpenAI to analyze keywords and suggest secondary ones.
+
+    Depending on KEYWORD_SELECTION the local selector answers first and the LLM is only
+    asked when its confidence is low. The request is routed to the fast model from
+    KEYWORD_ANALYSIS_ROUTE and escalated to the larger model only when the reply fails
+    validation. Returns the canonical three-line analysis; if every LLM attempt failed
+    that is the local selection in auto mode, otherwise an empty string.
+    """
+    selection = {**KEYWORD_SELECTION, **(selection or {})}
+    local_result = None
+    if selection["mode"] in ("local", "auto"):
+        local_result = select_keywords(primary_keyword, keywords_data)
+        confident = (local_result["confidence"] >= selection["min_confidence"]
+                     and len(local_result["secondary_keywords"]) == 3)
+        if selection["mode"] == "local" or confident:
+            print(f"Local keyword selection used (confidence {local_result['confidence']})")
+            return format_keyword_analysis(local_result)
+        print(f"Local keyword selection confidence {local_result['confidence']} too low, asking the LLM")
+
+    route = {**KEYWORD_ANALYSIS_ROUTE, **(route or {})}
+    client = OpenAI(api_key=OPENAI_API_KEY)
+
+    user_prompt = f"Query: {primary_keyword}\nRows:\n{compact_keyword_rows(keywords_data[:10])}"
+    messages = [
+        {"role": "system", "content": KEYWORD_ANALYSIS_PROMPT},
+        {"role": "user", "content": user_prompt}
+    ]
+
+    models = [route["model"]]
+    if route.get("escalation_model") and route["escalation_model"] != route["model"]:
+        models.append(route["escalation_model"])
+
+    for model in models:
+        try:
+            response = create_chat_completion(
+                client,
+                model=model,
+                fallback_models=[model],
+                messages=messages,
+                temperature=0,
+                max_tokens=route["max_tokens"],
+                on_usage=on_usage,
+                **KEYWORD_ANALYSIS_CALL_OPTIONS
+            )
+            parsed = parse_keyword_analysis(response.choices[0].message.content)
+        except Exception as e:
+            print(f"❌ Keyword analysis with {model} failed: {str(e)}")
+            continue
+
+        if parsed:
+            return format_keyword_analysis(parsed)
+        print(f"⚠️ Unparseable keyword analysis from {model}, escalating")
+
+    if local_result is not None:
+        print("Falling back to the low-confidence local keyword selection")
+        return format_keyword_analysis(local_result)
+    return ""
 
 def main():
     """Main script function to get keyword suggestions, fetch their metrics, and analyze with OpenAI."""
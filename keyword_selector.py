@@ -0,0 +1,171 @@
+import math
+import re
+from typing import Dict, List, Optional
+
+# Weights of the local keyword score. Each component is normalised to 0..1.
+SELECTOR_WEIGHTS = {
+    "relevance": 0.40,    # token overlap with the search query
+    "volume": 0.25,       # log-scaled search volume
+    "priority": 0.15,     # Moz priority score
+    "organic_ctr": 0.10,  # Moz organic CTR
+    "difficulty": 0.10,   # inverted Moz difficulty (easier is better)
+}
+
+# Minimum relevance for a keyword to be chosen as the primary keyword
+PRIMARY_MIN_RELEVANCE = 0.5
+
+# Query modifiers used to infer content intent
+INTENT_MODIFIERS = {
+    "transactional": ["buy", "price", "prices", "pricing", "cheap", "deal", "deals", "discount",
+                      "coupon", "order", "for sale", "shop", "near me", "cost", "hire", "subscribe"],
+    "commercial": ["best", "top", "review", "reviews", "vs", "versus", "compare", "comparison",
+                   "alternative", "alternatives", "recommended", "rated"],
+    "navigational": ["login", "log in", "sign in", "signin", "official", "website", "site",
+                     "homepage", "contact", "customer service", "app"],
+    "informational": ["how", "what", "why", "when", "who", "guide", "tutorial", "tips", "ideas",
+                      "examples", "meaning", "definition", "learn", "benefits", "types"],
+}
+
+_MONTHS = ("january|february|march|april|may|june|july|august|september|october|november|december|"
+           "jan|feb|mar|apr|jun|jul|aug|sep|sept|oct|nov|dec")
+_DATE_OR_NUMBER = re.compile(r"\d|\b(" + _MONTHS + r")\b", re.IGNORECASE)
+_TOKEN = re.compile(r"[a-z0-9']+")
+
+
+def _normalize_token(token: str) -> str:
+    """Very light singularisation so plural/singular forms compare equal"""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def keyword_tokens(text: str) -> frozenset:
+    return frozenset(_normalize_token(t) for t in _TOKEN.findall(text.lower()))
+
+
+def has_number_or_date(keyword: str) -> bool:
+    return bool(_DATE_OR_NUMBER.search(keyword))
+
+
+def _metric(value) -> Optional[float]:
+    """Moz metrics may be missing or 'N/A'"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def infer_intent(texts: List[str]) -> Dict:
+    """Infer content intent from query modifiers.
+
+    Earlier texts weigh more (pass the search query first). Returns the intent and a
+    0..1 confidence; without any modifier the intent defaults to informational.
+    """
+    scores = {intent: 0.0 for intent in INTENT_MODIFIERS}
+    for position, text in enumerate(texts):
+        padded = f" {' '.join(_TOKEN.findall(text.lower()))} "
+        weight = 2.0 if position == 0 else 1.0
+        for intent, modifiers in INTENT_MODIFIERS.items():
+            for modifier in modifiers:
+                if f" {modifier} " in padded:
+                    scores[intent] += weight
+
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    (best, best_score), (_, runner_up) = ranked[0], ranked[1]
+    if best_score == 0:
+        return {"intent": "informational", "confidence": 0.4}
+    return {"intent": best, "confidence": round((best_score - runner_up) / best_score, 3)}
+
+
+def score_keywords(search_query: str, keywords_data: List[Dict], weights: Dict = None) -> List[Dict]:
+    """Score keyword rows with the weighted formula; rows with numbers or dates are dropped."""
+    weights = weights or SELECTOR_WEIGHTS
+    query_tokens = keyword_tokens(search_query)
+
+    volumes = [_metric(row.get("volume")) for row in keywords_data]
+    max_volume = max([v for v in volumes if v is not None and v > 0], default=0)
+
+    scored = []
+    for row, volume in zip(keywords_data, volumes):
+        keyword = str(row.get("keyword", "")).strip()
+        if not keyword or has_number_or_date(keyword):
+            continue
+        tokens = keyword_tokens(keyword)
+        union = tokens | query_tokens
+        components = {
+            "relevance": len(tokens & query_tokens) / len(union) if union else 0.0,
+            "volume": math.log1p(volume) / math.log1p(max_volume) if volume and max_volume else None,
+        }
+        for field in ("priority", "organic_ctr"):
+            value = _metric(row.get(field))
+            components[field] = min(max(value / 100.0, 0.0), 1.0) if value is not None else None
+        difficulty = _metric(row.get("difficulty"))
+        components["difficulty"] = 1.0 - min(max(difficulty / 100.0, 0.0), 1.0) if difficulty is not None else None
+
+        known = [name for name, value in components.items() if value is not None]
+        score = sum(weights.get(name, 0) * components[name] for name in known)
+        scored.append({
+            "keyword": keyword,
+            "tokens": tokens,
+            "score": round(score, 4),
+            "components": components,
+            "coverage": len(known) / len(components),
+        })
+
+    scored.sort(key=lambda item: item["score"], reverse=True)
+    return scored
+
+
+def select_keywords(search_query: str, keywords_data: List[Dict], weights: Dict = None,
+                    secondary_count: int = 3) -> Dict:
+    """Pick primary and secondary keywords plus intent without calling an LLM.
+
+    Returns primary_keyword, secondary_keywords, intent and a 0..1 confidence that
+    callers use to decide whether an LLM pass is still needed.
+    """
+    scored = score_keywords(search_query, keywords_data, weights)
+
+    primary_candidates = [item for item in scored if item["components"]["relevance"] >= PRIMARY_MIN_RELEVANCE]
+    if primary_candidates:
+        primary = primary_candidates[0]
+        runner_up = primary_candidates[1]["score"] if len(primary_candidates) > 1 else 0.0
+        margin = min(1.0, (primary["score"] - runner_up) / 0.1)
+        primary_keyword, primary_tokens = primary["keyword"], primary["tokens"]
+        coverage = primary["coverage"]
+    else:
+        # Nothing close to the query: keep the query itself (minus numbers and dates)
+        primary_keyword = " ".join(_DATE_OR_NUMBER.sub(" ", search_query).split()) or search_query
+        primary_tokens = keyword_tokens(primary_keyword)
+        margin, coverage = 0.0, 0.0
+
+    secondary = []
+    chosen_tokens = [primary_tokens]
+    for item in scored:
+        if len(secondary) == secondary_count:
+            break
+        # Skip reorderings/plural variants of keywords already chosen, and unrelated rows
+        if item["tokens"] in chosen_tokens or not (item["tokens"] & primary_tokens):
+            continue
+        secondary.append(item)
+        chosen_tokens.append(item["tokens"])
+
+    secondary_keywords = [item["keyword"] for item in secondary]
+    intent = infer_intent([search_query, primary_keyword] + secondary_keywords)
+
+    fill = len(secondary) / secondary_count if secondary_count else 1.0
+    if secondary:
+        coverage = (coverage + sum(item["coverage"] for item in secondary) / len(secondary)) / 2
+    confidence = 0.3 * fill + 0.25 * coverage + 0.25 * intent["confidence"] + 0.2 * margin
+    if len(secondary) < secondary_count:
+        confidence = min(confidence, 0.5)
+
+    return {
+        "primary_keyword": primary_keyword,
+        "secondary_keywords": secondary_keywords,
+        "intent": intent["intent"],
+        "confidence": round(confidence, 3),
+    }
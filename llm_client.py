@@ -0,0 +1,273 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, List, Optional
+
+from openai import APIConnectionError, InternalServerError, RateLimitError
+
+from config import get_setting
+from replay import provider_call
+
+# Default call policy for OpenAI chat completions. Override per call with keyword
+# arguments to create_chat_completion().
+LLM_CALL_DEFAULTS = {
+    "timeout": 60.0,            # per-attempt deadline in seconds
+    "deadline": 180.0,          # overall deadline across retries and fallbacks
+    "max_retries": 2,           # retries per model after the first attempt
+    "backoff_base": 1.0,        # first backoff delay in seconds
+    "backoff_max": 8.0,         # cap for a single backoff delay
+    "hedge": False,             # send a second request when the first is slow
+    "hedge_percentile": 95,     # latency percentile that triggers the hedge
+    "hedge_min_samples": 20,    # observations needed before the percentile is trusted
+    "hedge_default_delay": 20.0,  # hedge delay used until enough samples exist
+    "hedge_min_delay": 1.0,     # never hedge earlier than this
+}
+
+# Fallback chains: when every attempt on a model fails, the next model is tried.
+MODEL_FALLBACKS = {
+    "gpt-4o": ["gpt-4o", "gpt-4-turbo"],
+    "gpt-4": ["gpt-4", "gpt-4o"],
+}
+
+
+class LLMCallError(Exception):
+    """Raised when every model in the fallback chain failed or the deadline expired"""
+
+
+class TransientLLMError(Exception):
+    """A recorded timeout, rate limit, connection error or 5xx, raised again on replay"""
+
+
+# Failures worth another attempt (APIConnectionError includes timeouts). Anything else,
+# e.g. a 400 or an authentication error, fails the same way on every retry.
+RETRYABLE_ERRORS = (TransientLLMError, APIConnectionError, RateLimitError, InternalServerError)
+
+
+class LatencyTracker:
+    """Keeps a rolling window of completion latencies per model"""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, seconds: float, outcome: str = "ok"):
+        """Record one attempt; only successful attempts feed the latency window"""
+        with self._lock:
+            if outcome == "ok":
+                self._samples.setdefault(model, deque(maxlen=self.window)).append(seconds)
+            counters = self._counters.setdefault(model, {})
+            counters[outcome] = counters.get(outcome, 0) + 1
+
+    def count(self, model: str, outcome: str, n: int = 1):
+        """Increment a named counter (e.g. hedges sent or won)"""
+        with self._lock:
+            counters = self._counters.setdefault(model, {})
+            counters[outcome] = counters.get(outcome, 0) + n
+
+    def percentile(self, model: str, pct: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(model, ()))
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, int(round(pct / 100.0 * (len(samples) - 1)))))
+        return samples[index]
+
+    def sample_count(self, model: str) -> int:
+        with self._lock:
+            return len(self._samples.get(model, ()))
+
+    def summary(self) -> Dict[str, Dict]:
+        """Latency distribution and outcome counters per model"""
+        with self._lock:
+            models = set(self._samples) | set(self._counters)
+            snapshot = {
+                model: (sorted(self._samples.get(model, ())), dict(self._counters.get(model, {})))
+                for model in models
+            }
+        summary = {}
+        for model, (samples, counters) in snapshot.items():
+            stats = {"samples": len(samples), **counters}
+            if samples:
+                for pct in (50, 90, 95, 99):
+                    index = min(len(samples) - 1, int(round(pct / 100.0 * (len(samples) - 1))))
+                    stats[f"p{pct}"] = round(samples[index], 3)
+                stats["max"] = round(samples[-1], 3)
+            summary[model] = stats
+        return summary
+
+
+latency_tracker = LatencyTracker()
+
+# Shared pool for hedged requests; abandoned losers finish in the background. Work is
+# only submitted when a worker is free (see _submit_hedged), so calls never queue here.
+_hedge_workers = get_setting("LLM_HEDGE_WORKERS")
+_hedge_pool = ThreadPoolExecutor(max_workers=_hedge_workers, thread_name_prefix="llm-hedge")
+_hedge_slots = threading.BoundedSemaphore(_hedge_workers)
+
+
+def get_latency_stats() -> Dict[str, Dict]:
+    """Observed latency percentiles and outcome counts, for tuning hedge thresholds"""
+    return latency_tracker.summary()
+
+
+def _hedge_delay(model: str, options: Dict) -> float:
+    if latency_tracker.sample_count(model) < options["hedge_min_samples"]:
+        delay = options["hedge_default_delay"]
+    else:
+        delay = latency_tracker.percentile(model, options["hedge_percentile"])
+    return max(options["hedge_min_delay"], delay)
+
+
+def _single_attempt(client, model: str, messages: List[Dict], timeout: float, params: Dict):
+    start = time.perf_counter()
+    try:
+        response = client.with_options(timeout=timeout, max_retries=0).chat.completions.create(
+            model=model,
+            messages=messages,
+            **params
+        )
+    except Exception:
+        latency_tracker.record(model, time.perf_counter() - start, outcome="error")
+        raise
+    latency_tracker.record(model, time.perf_counter() - start)
+    return response
+
+
+def _submit_hedged(fn, *args):
+    """Run fn on the hedge pool if a worker is free right now, else return None"""
+    if not _hedge_slots.acquire(blocking=False):
+        return None
+    try:
+        future = _hedge_pool.submit(fn, *args)
+    except Exception:
+        _hedge_slots.release()
+        raise
+    future.add_done_callback(lambda _: _hedge_slots.release())
+    return future
+
+
+def _record_loser_usage(future, model: str, on_usage: Optional[Callable]):
+    """Meter the tokens of a hedged request whose answer was not used"""
+    if on_usage is None or future.cancelled() or future.exception() is not None:
+        return
+    usage = getattr(future.result(), "usage", None)
+    if usage is not None:
+        try:
+            on_usage(model, usage)
+        except Exception as e:
+            print(f"Recording usage of a hedged request to {model} failed: {str(e)}")
+
+
+def _hedged_attempt(client, model: str, messages: List[Dict], timeout: float, params: Dict, options: Dict,
+                    on_usage: Optional[Callable] = None):
+    """Send one request, and a second one if the first is slower than the hedge delay.
+
+    When the hedge pool is saturated the request runs unhedged on the caller's thread.
+    The losing request is still billed, so its usage goes to on_usage when it completes.
+    """
+    delay = _hedge_delay(model, options)
+    primary = _submit_hedged(_single_attempt, client, model, messages, timeout, params) if delay < timeout else None
+    if primary is None:
+        if delay < timeout:
+            latency_tracker.count(model, "hedge_skipped")
+        return _single_attempt(client, model, messages, timeout, params)
+
+    done, _ = wait([primary], timeout=delay)
+    if done:
+        return primary.result()
+
+    hedge = _submit_hedged(_single_attempt, client, model, messages, max(timeout - delay, 1.0), params)
+    if hedge is None:
+        latency_tracker.count(model, "hedge_skipped")
+        return primary.result()
+    latency_tracker.count(model, "hedge_sent")
+    pending = {primary, hedge}
+    last_error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                response = future.result()
+            except Exception as e:
+                last_error = e
+                continue
+            if future is hedge:
+                latency_tracker.count(model, "hedge_won")
+            loser = primary if future is hedge else hedge
+            loser.add_done_callback(lambda f: _record_loser_usage(f, model, on_usage))
+            return response
+    raise last_error
+
+
+def _dump_completion(response) -> Dict:
+    return response.model_dump(mode="json")
+
+
+def _load_completion(data: Dict):
+    from openai.types.chat import ChatCompletion
+    return ChatCompletion.model_validate(data)
+
+
+def create_chat_completion(
+    client,
+    messages: List[Dict],
+    model: str = "gpt-4o",
+    fallback_models: Optional[List[str]] = None,
+    on_usage: Optional[Callable] = None,
+    **kwargs
+):
+    """Create a chat completion with deadlines, bounded retries, optional hedging and model fallback.
+
+    Extra keyword arguments matching LLM_CALL_DEFAULTS override the call policy; the
+    rest (temperature, max_tokens, ...) are passed to the OpenAI API. Only
+    RETRYABLE_ERRORS are retried or fall back; other errors are raised immediately.
+    """
+    options = dict(LLM_CALL_DEFAULTS)
+    for key in list(kwargs):
+        if key in options:
+            options[key] = kwargs.pop(key)
+    params = kwargs
+
+    models = fallback_models if fallback_models is not None else MODEL_FALLBACKS.get(model, [model])
+    if model not in models:
+        models = [model] + list(models)
+
+    deadline = time.monotonic() + options["deadline"]
+    last_error = None
+    for current_model in models:
+        for attempt in range(options["max_retries"] + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise LLMCallError(f"Deadline of {options['deadline']}s exceeded: {last_error}")
+            timeout = min(options["timeout"], remaining)
+            try:
+                response = provider_call(
+                    "openai", {"model": current_model, "messages": messages, **params},
+                    lambda: (
+                        _hedged_attempt(client, current_model, messages, timeout, params, options, on_usage)
+                        if options["hedge"] else
+                        _single_attempt(client, current_model, messages, timeout, params)
+                    ),
+                    errors=RETRYABLE_ERRORS,
+                    # Lets replays survive prompt changes: same model and system prompt
+                    fallback_request={"model": current_model, "system": messages[0]["content"] if messages else ""},
+                    encode=_dump_completion, decode=_load_completion
+                )
+                if on_usage is not None and getattr(response, "usage", None) is not None:
+                    on_usage(current_model, response.usage)
+                return response
+            except RETRYABLE_ERRORS as e:
+                last_error = e
+                print(f"LLM call to {current_model} failed (attempt {attempt + 1}/{options['max_retries'] + 1}): {str(e)}")
+                if attempt < options["max_retries"]:
+                    backoff = min(options["backoff_max"], options["backoff_base"] * (2 ** attempt))
+                    backoff = backoff * (0.5 + random.random() / 2)  # jitter
+                    time.sleep(max(0.0, min(backoff, deadline - time.monotonic())))
+        if current_model != models[-1]:
+            print(f"Falling back from {current_model} to the next model")
+
+    raise LLMCallError(f"All models failed ({', '.join(models)}): {last_error}")
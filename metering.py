@@ -0,0 +1,283 @@
+import json
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from config import get_setting
+
+# Unit prices in USD; adjust to your plans. OpenAI prices are (input, output) per 1M
+# tokens, the others are per billable request or credit.
+PRICING = {
+    "openai": {
+        "gpt-4o": (2.50, 10.00),
+        "gpt-4o-mini": (0.15, 0.60),
+        "gpt-4": (30.00, 60.00),
+    },
+    "moz": 0.005,        # per JSON-RPC call
+    "serpapi": 0.015,    # per search
+    "firecrawl": 0.001,  # per credit
+}
+
+# Models missing from PRICING are charged like the most expensive one
+DEFAULT_OPENAI_PRICE = (30.00, 60.00)
+
+# Budget caps (overridable through the environment, see config.SETTINGS)
+BUDGETS = {
+    "run_usd": get_setting("RUN_BUDGET_USD"),
+    "hour_usd": get_setting("HOURLY_BUDGET_USD"),
+    "near_cap_ratio": 0.8,  # share of a budget after which runs switch to reduced work
+}
+
+# Clock hours of aggregates kept in memory
+HOURS_KEPT = 48
+
+
+class BudgetExceededError(Exception):
+    """Raised when a run or the current hour has no budget left"""
+
+
+def _empty_totals() -> Dict:
+    return {"calls": 0, "units": 0, "cached": 0, "cost_usd": 0.0}
+
+
+def _add(totals: Dict, units: int, cost: float, cached: bool):
+    if cached:
+        totals["cached"] += 1
+        return
+    totals["calls"] += 1
+    totals["units"] += units
+    totals["cost_usd"] += cost
+
+
+def openai_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    input_price, output_price = PRICING["openai"].get(model, DEFAULT_OPENAI_PRICE)
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+class UsageMeter:
+    """Process-wide usage per clock hour and provider, with the hourly budget.
+
+    Units are tokens for OpenAI, calls for Moz, searches for SerpAPI and credits for
+    Firecrawl; cached responses are counted separately and cost nothing.
+    """
+
+    def __init__(self, hour_budget: Optional[float] = None, log_path: Optional[str] = None):
+        self.hour_budget = BUDGETS["hour_usd"] if hour_budget is None else hour_budget
+        self.log_path = log_path or get_setting("USAGE_LOG_PATH")
+        self._lock = threading.Lock()
+        self._hours: "OrderedDict[str, Dict[str, Dict]]" = OrderedDict()
+        self._search_ids: "OrderedDict[str, None]" = OrderedDict()
+
+    @staticmethod
+    def _hour_key() -> str:
+        return datetime.now().strftime("%Y-%m-%dT%H")
+
+    def add(self, provider: str, units: int, cost: float, cached: bool = False):
+        with self._lock:
+            hour = self._hours.setdefault(self._hour_key(), {})
+            _add(hour.setdefault(provider, _empty_totals()), units, cost, cached)
+            while len(self._hours) > HOURS_KEPT:
+                self._hours.popitem(last=False)
+
+    def is_new_search(self, search_id: str) -> bool:
+        """False if this SerpAPI search id was already billed (e.g. a cached response)"""
+        with self._lock:
+            if search_id in self._search_ids:
+                return False
+            self._search_ids[search_id] = None
+            if len(self._search_ids) > 10000:
+                self._search_ids.popitem(last=False)
+            return True
+
+    def hour_cost(self) -> float:
+        with self._lock:
+            hour = self._hours.get(self._hour_key(), {})
+            return sum(totals["cost_usd"] for totals in hour.values())
+
+    def hour_remaining(self) -> float:
+        return self.hour_budget - self.hour_cost()
+
+    def summary(self) -> Dict:
+        """Per-hour and per-provider totals held in memory"""
+        with self._lock:
+            hours = {
+                key: {provider: dict(totals) for provider, totals in providers.items()}
+                for key, providers in self._hours.items()
+            }
+        current = hours.get(self._hour_key(), {})
+        return {
+            "hours": hours,
+            "current_hour_cost_usd": round(sum(t["cost_usd"] for t in current.values()), 4),
+            "hour_budget_usd": self.hour_budget,
+        }
+
+    def log_run(self, record: Dict):
+        """Append one run's usage record to the JSONL usage log"""
+        if not self.log_path:
+            return
+        try:
+            with self._lock, open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            print(f"Error writing usage log: {str(e)}")
+
+
+usage_meter = UsageMeter()
+
+
+def mark_search_cached(serp_data: Dict):
+    """Note a SerpAPI response served from a local cache, so RunMeter.record_serp does not bill it"""
+    search_id = (serp_data or {}).get("search_metadata", {}).get("id")
+    if search_id:
+        usage_meter.is_new_search(search_id)
+
+
+class RunMeter:
+    """Usage and budget of one pipeline run; every record also goes to the process meter.
+
+    Callable as the on_usage callback of llm_client.create_chat_completion().
+    """
+
+    def __init__(self, label: str = "", budget: Optional[float] = None, meter: Optional[UsageMeter] = None):
+        self.label = label
+        self.budget = BUDGETS["run_usd"] if budget is None else budget
+        self.meter = meter or usage_meter
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.providers: Dict[str, Dict] = {}
+        self.tokens_by_model: Dict[str, Dict[str, int]] = {}
+        self.reductions: List[str] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, model: str, usage):
+        self.record_openai(model, usage)
+
+    def acquire(self, provider: str):
+        """Called before each live call where rate limiting applies; a no-op here
+        (prefetch.PrefetchMeter blocks on its rate limiter)"""
+
+    def record(self, provider: str, units: int = 1, cost: Optional[float] = None, cached: bool = False):
+        if cost is None:
+            cost = 0.0 if cached else units * PRICING[provider]
+        with self._lock:
+            _add(self.providers.setdefault(provider, _empty_totals()), units, cost, cached)
+        self.meter.add(provider, units, cost, cached)
+
+    def record_openai(self, model: str, usage):
+        """Record a completion from the token counts in response.usage"""
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        with self._lock:
+            totals = self.tokens_by_model.setdefault(model, {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0})
+            totals["prompt_tokens"] += prompt_tokens
+            totals["completion_tokens"] += completion_tokens
+            totals["total_tokens"] += prompt_tokens + completion_tokens
+        self.record("openai", prompt_tokens + completion_tokens, openai_cost(model, prompt_tokens, completion_tokens))
+
+    def record_serp(self, serp_data: Dict):
+        """Record a SerpAPI response; a search id seen before is a cached copy"""
+        search_id = (serp_data or {}).get("search_metadata", {}).get("id")
+        self.record("serpapi", cached=bool(search_id) and not self.meter.is_new_search(search_id))
+
+    def record_scrape(self, result: Dict):
+        """Record a Firecrawl scrape, using the reported credits when present"""
+        metadata = (result or {}).get("metadata", {}) or {}
+        self.record("firecrawl", int(metadata.get("creditsUsed") or 1))
+
+    @property
+    def cost(self) -> float:
+        with self._lock:
+            return sum(totals["cost_usd"] for totals in self.providers.values())
+
+    def headroom(self) -> float:
+        """Share (0..1) of the tighter of the run and hourly budgets still unspent"""
+        run_share = 1 - self.cost / self.budget if self.budget else 0.0
+        hour_share = self.meter.hour_remaining() / self.meter.hour_budget if self.meter.hour_budget else 0.0
+        return max(0.0, min(run_share, hour_share))
+
+    def near_cap(self) -> bool:
+        return self.headroom() <= 1 - BUDGETS["near_cap_ratio"]
+
+    def check(self, stage: str):
+        """Raise BudgetExceededError if nothing is left for the next stage"""
+        if self.headroom() <= 0:
+            raise BudgetExceededError(
+                f"Budget exhausted before {stage}: run ${self.cost:.4f} of ${self.budget:.2f}, "
+                f"hour ${self.meter.hour_cost():.4f} of ${self.meter.hour_budget:.2f}"
+            )
+
+    def scaled(self, stage: str, full: int, reduced: int) -> int:
+        """full normally, reduced (and noted in the summary) when close to a budget cap"""
+        if self.near_cap():
+            self.reductions.append(f"{stage}: {full} -> {reduced}")
+            print(f"Near budget cap, reducing {stage} from {full} to {reduced}")
+            return reduced
+        return full
+
+    def summary(self) -> Dict:
+        with self._lock:
+            providers = {provider: dict(totals) for provider, totals in self.providers.items()}
+        for totals in providers.values():
+            totals["cost_usd"] = round(totals["cost_usd"], 6)
+        return {
+            "label": self.label,
+            "started_at": self.started_at,
+            "cost_usd": round(self.cost, 6),
+            "budget_usd": self.budget,
+            "providers": providers,
+            "tokens_by_model": self.tokens_by_model,
+            "reductions": self.reductions,
+        }
+
+    def finish(self, status: str = "ok") -> Dict:
+        """Write the run's usage record to the usage log and return it"""
+        record = {**self.summary(), "status": status}
+        self.meter.log_run(record)
+        return record
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(percentile / 100 * len(ordered)))]
+
+
+def aggregate_usage_log(path: str) -> Dict:
+    """Totals per provider and per hour, plus cost per run percentiles, from a usage log"""
+    runs, providers, hours = [], {}, {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            runs.append(record)
+            hour = hours.setdefault(record["started_at"][:13], {"runs": 0, "cost_usd": 0.0})
+            hour["runs"] += 1
+            hour["cost_usd"] += record["cost_usd"]
+            for provider, totals in record["providers"].items():
+                aggregate = providers.setdefault(provider, _empty_totals())
+                for field in aggregate:
+                    aggregate[field] += totals.get(field, 0)
+
+    for totals in list(providers.values()) + list(hours.values()):
+        totals["cost_usd"] = round(totals["cost_usd"], 4)
+    costs = [run["cost_usd"] for run in runs]
+    return {
+        "runs": len(runs),
+        "failed_runs": sum(1 for run in runs if run.get("status") != "ok"),
+        "reduced_runs": sum(1 for run in runs if run.get("reductions")),
+        "total_cost_usd": round(sum(costs), 4),
+        "cost_per_run_usd": {
+            "mean": round(sum(costs) / len(costs), 4),
+            "p50": round(_percentile(costs, 50), 4),
+            "p90": round(_percentile(costs, 90), 4),
+            "max": round(max(costs), 4),
+        } if costs else {},
+        "providers": providers,
+        "hours": hours,
+    }
+
+
+if __name__ == "__main__":
+    log_path = sys.argv[1] if len(sys.argv) > 1 else get_setting("USAGE_LOG_PATH")
+    print(json.dumps(aggregate_usage_log(log_path), indent=2))
@@ -1,26 +1,153 @@
 from firecrawl import FirecrawlApp
 import json
 from datetime import datetime
-from typing import List, Dict
+from typing import Callable, List, Dict
+from concurrent.futures import Future, ThreadPoolExecutor
 import time
 import re
-from bs4 import BeautifulSoup
 from collections import Counter
 from openai import OpenAI
 import requests
 import os
 from dotenv import load_dotenv
-import streamlit as st  # Use Streamlit secrets
+from llm_client import create_chat_completion
+from outline_store import OutlineStore
+from fingerprints import FingerprintStore, simhash, fingerprint_text, is_near_duplicate
+from query_index import unordered_key
+from content_analysis import analyze_document
+from analysis_executor import AnalysisExecutor
+from replay import provider_call
+from response_cache import get_response_cache
+from metering import mark_search_cached
+from config import get_secret, get_setting
+
+# Format requested from Firecrawl and analyzed: 'html' (BeautifulSoup over the page
+# HTML, also downloads markdown) or 'markdown' (markdown only, line scanner, no HTML
+# parse). bench_content_formats.py compares the two. Default from the CONTENT_FORMAT setting.
+CONTENT_FORMATS = ('html', 'markdown')
+CONTENT_FORMAT = get_setting('CONTENT_FORMAT')
+
+# How much SERP and competitor data goes into the LLM context (None = everything).
+# 'compact' is used when a run is close to its budget (see metering.RunMeter).
+CONTEXT_LIMITS = {
+    'full': {'top_articles': 5, 'paa_questions': None, 'related_searches': None, 'competitors': None, 'coverage_topics': 40},
+    'compact': {'top_articles': 3, 'paa_questions': 5, 'related_searches': 5, 'competitors': 3, 'coverage_topics': 15},
+}
+
+# How analyze_with_llm() generates the outline: 'single' (one completion for the whole
+# outline) or 'sections' (OUTLINE_SECTION_PROMPTS run concurrently on the same context
+# and merged, so latency is close to that of the longest section). Default from the
+# OUTLINE_GENERATION setting.
+OUTLINE_GENERATION_MODES = ('single', 'sections')
+OUTLINE_GENERATION = get_setting('OUTLINE_GENERATION')
+
+if CONTENT_FORMAT not in CONTENT_FORMATS or OUTLINE_GENERATION not in OUTLINE_GENERATION_MODES:
+    raise ValueError(f"Unsupported CONTENT_FORMAT {CONTENT_FORMAT!r} or OUTLINE_GENERATION {OUTLINE_GENERATION!r}")
+
+# Shared instructions for every section prompt in 'sections' mode
+OUTLINE_SECTION_HEADER = """You are writing one part of a comprehensive SEO article outline for: {query}
+Other parts are written separately from the same research, so output only the part requested below.
+
+Primary keyword: {query}
+Secondary keywords: {secondary_keywords}
+Search intent: {intent}
+If there is a date mentioned in any tag, change it to the present year (2025).
+"""
+
+# Section prompts in output order, with their completion token limits. Each reply must
+# start with the first label of its section, exactly as written.
+OUTLINE_SECTION_PROMPTS = {
+    'meta': ("""Write the SEO metadata: a meta title of 50-60 characters and a meta description of 130-155 characters.
+Structure the output exactly as follows:
+
+Primary keyword: [Insert primary keyword]
+Secondary keywords: [Insert secondary keywords]
+
+Meta title: [Insert optimized title]
+Meta description: [Insert compelling description]
+
+Slug: [Insert primary keyword as slug]
+""", 'Primary keyword:', 400),
+    'body': ("""Write the article structure, covering the topics competitors cover and the gaps they leave.
+Structure the output exactly as follows:
+
+Outline:
+
+H1 Options: 
+[Provide 3-5 title options]
+
+Introduction:
+[Outline approach and key points]
+
+H2: [Main section title]
+  - H3: [Subsection points]
+  - H3: [Subsection points]
+[Continue with all H2 and H3 sections]
+
+Conclusion: [Outline approach]
+""", 'Outline:', 2000),
+    'faq': ("""Write five FAQ questions searchers ask about this topic (use the People Also Ask questions).
+Structure the output exactly as follows:
+
+FAQ:
+1. [Question 1]
+2. [Question 2]
+3. [Question 3]
+4. [Question 4]
+5. [Question 5]
+""", 'FAQ:', 400),
+    'guidelines': ("""Write the writing guidelines, including suggested internal linking topics and methods (e.g., linking to pillar pages, related articles, or product pages) and the types of external sources to reference, then predict the best article format.
+Structure the output exactly as follows:
+
+Writing Guidelines:
+- Word count target: [ Predict Based on the competitor analysis]
+- Content tone: Professional
+- Statistics/data placement
+- Expert quote areas
+- Visual content opportunities
+- Content upgrades/lead magnets
+- Key takeaways
+- Internal/external linking strategy
+
+Article Type Prediction: 
+
+Based on SERP analysis, competitor data, and {query}, the best article format for this topic is:  
+[Insert predicted article type - e.g., "How-To Guide," "Listicle," "Comparison Blog," "Technical Article," "Product Review," etc.]  
+
+Justification:  
+- [Explain why this format is ideal based on user search behavior, top-ranking content structures, and competitor trends]  
+""", 'Writing Guidelines:', 900),
+}
+
+_HEADING_NUMBERING = re.compile(r'^\s*(?:(?:step|part|chapter)\s*)?(?:\d+|[ivx]+)\s*[\.\):-]\s*|^\s*#?\d+\s+', re.IGNORECASE)
+
 
-@st.cache_resource
-def get_requests_session():
-    return requests.Session()
+def normalize_heading(text: str) -> str:
+    """Key for matching equivalent headings across pages (numbering, case, order ignored)"""
+    return unordered_key(_HEADING_NUMBERING.sub('', text))
+
+
+# Persistent session for SerpAPI requests
+SERP_SESSION = requests.Session()
 
 
 class LLMEnhancedAnalyzer:
-    def __init__(self, firecrawl_api_key: str, openai_api_key: str):
+    def __init__(self, firecrawl_api_key: str, openai_api_key: str,
+                 llm_model: str = "gpt-4o", llm_call_options: Dict = None, on_usage=None,
+                 fingerprint_store: FingerprintStore = None, analysis_executor: AnalysisExecutor = None,
+                 content_format: str = None, meter=None, generation_mode: str = None):
         self.firecrawl = FirecrawlApp(api_key=firecrawl_api_key)
         self.openai_client = OpenAI(api_key=openai_api_key)
+        self.llm_model = llm_model
+        self.llm_call_options = llm_call_options or {}
+        self.on_usage = on_usage  # called with (model, usage) after each completion
+        self.fingerprint_store = fingerprint_store
+        self.analysis_executor = analysis_executor
+        self.analysis_timings = {}  # queue wait vs compute seconds of pooled analysis
+        self.content_format = content_format or CONTENT_FORMAT
+        self.meter = meter  # metering.RunMeter recording Firecrawl credits
+        self.context_limits = CONTEXT_LIMITS['full']
+        self.generation_mode = generation_mode or OUTLINE_GENERATION
         self.article_intent = ""
         self.secondary_keywords = []
 
@@ -69,34 +196,85 @@ class LLMEnhancedAnalyzer:
                 for search in data.get('related_searches', [])]
 
     def scrape_competitor_content(self, urls: List[str]) -> List[Dict]:
-        """Scrape and analyze competitor content"""
+        """Scrape and analyze competitor content.
+
+        Near-duplicate pages (by SimHash) are not re-analyzed: they reuse the analysis of
+        the first copy and are marked with 'duplicate_of'. With a fingerprint store,
+        pages already known to duplicate an earlier URL are not even scraped.
+        """
         scraped_content = []
+        seen = []  # (url, fingerprint, analysis) of pages analyzed in this run
+        known = self.fingerprint_store.get_many(urls) if self.fingerprint_store else {}
+        response_cache = get_response_cache()
         
         for url in urls:
             try:
+                stored = known.get(url)
+                if stored:
+                    original = self.find_duplicate(stored['simhash'], seen)
+                    if original:
+                        print(f"Skipping known duplicate: {url} (same content as {original[0]})")
+                        scraped_content.append({
+                            'url': url,
+                            'content': '',
+                            'analysis': original[2],
+                            'duplicate_of': original[0]
+                        })
+                        continue
+
                 # Basic scraping parameters
                 params = {
-                    'formats': ['markdown', 'html']
+                    'formats': ['markdown'] if self.content_format == 'markdown' else ['markdown', 'html']
                 }
                 
                 # Perform the scrape with retry logic
                 max_retries = 3
                 for attempt in range(max_retries):
                     try:
-                        result = self.firecrawl.scrape_url(url, params=params)
+                        request = {"url": url, "params": params}
+                        result = response_cache.get("firecrawl", request) if response_cache else None
+                        if result is not None:
+                            if self.meter:
+                                self.meter.record("firecrawl", cached=True)
+                        else:
+                            if self.meter:
+                                self.meter.acquire("firecrawl")
+                            result = provider_call(
+                                "firecrawl", request,
+                                lambda: self.firecrawl.scrape_url(url, params=params),
+                                errors=(Exception,)
+                            )
+                            if self.meter:
+                                self.meter.record_scrape(result)
+                            if response_cache:
+                                response_cache.put("firecrawl", request, result)
                         
                         # Get content with fallback
-                        content = result.get('html', result.get('markdown', ''))
-                        
-                        # Analyze the content
-                        analysis = self.analyze_content(content)
+                        if self.content_format == 'markdown':
+                            content = result.get('markdown', '')
+                        else:
+                            content = result.get('html', result.get('markdown', ''))
+                        fingerprint = simhash(result.get('markdown') or fingerprint_text(content))
                         
                         content_data = {
                             'url': url,
                             'content': content,
-                            'analysis': analysis
+                            'fingerprint': fingerprint
                         }
                         
+                        original = self.find_duplicate(fingerprint, seen)
+                        if original:
+                            print(f"Near-duplicate of {original[0]}: {url}")
+                            content_data['analysis'] = original[2]
+                            content_data['duplicate_of'] = original[0]
+                            if self.fingerprint_store:
+                                # Remember the copy so later runs can skip scraping it
+                                self.fingerprint_store.put(url, fingerprint)
+                        else:
+                            # May be a Future when analysis runs in the process pool
+                            content_data['analysis'] = self.analyze_known_or_new(url, fingerprint, content)
+                            seen.append((url, fingerprint, content_data['analysis']))
+                        
                         scraped_content.append(content_data)
                         print(f"Successfully scraped: {url}")
                         break
@@ -110,38 +288,71 @@ class LLMEnhancedAnalyzer:
             except Exception as e:
                 print(f"Error processing {url}: {str(e)}")
                 continue
+
+        # Collect analyses still running in the process pool
+        resolved = {}
+        for url, fingerprint, analysis in seen:
+            if isinstance(analysis, Future):
+                try:
+                    result = analysis.result()
+                except Exception as e:
+                    print(f"Error analyzing {url}: {str(e)}")
+                    result = {}
+                resolved[id(analysis)] = result
+                if self.fingerprint_store and result:
+                    self.fingerprint_store.put(url, fingerprint, result.get('word_count'), result)
+        for content_data in scraped_content:
+            if isinstance(content_data['analysis'], Future):
+                content_data['analysis'] = resolved[id(content_data['analysis'])]
                 
         return scraped_content
 
+    def find_duplicate(self, fingerprint: int, seen: List[tuple]):
+        """First (url, fingerprint, analysis) entry whose fingerprint is a near-duplicate"""
+        for entry in seen:
+            if is_near_duplicate(fingerprint, entry[1]):
+                return entry
+        return None
+
+    def analyze_known_or_new(self, url: str, fingerprint: int, content: str):
+        """Reuse a stored analysis of identical content from earlier runs, else analyze.
+
+        Returns a Future instead of the analysis when an analysis executor is set; the
+        caller stores its fingerprint once it resolves.
+        """
+        if self.fingerprint_store:
+            for match in self.fingerprint_store.find_near(fingerprint):
+                if match['analysis']:
+                    print(f"Reusing analysis of {match['url']} for {url}")
+                    self.fingerprint_store.put(url, fingerprint, match['word_count'], match['analysis'])
+                    return match['analysis']
+
+        if self.analysis_executor:
+            return self.analysis_executor.submit(content, self.analysis_timings, self.content_format)
+
+        analysis = self.analyze_content(content)
+        if self.fingerprint_store and analysis:
+            self.fingerprint_store.put(url, fingerprint, analysis.get('word_count'), analysis)
+        return analysis
+
     def analyze_content(self, content: str) -> Dict:
         """Analyze scraped content for insights"""
-        try:
-            soup = BeautifulSoup(content, 'html.parser')
-            text_content = soup.get_text() if soup.get_text() else content
-
-            analysis = {
-                'word_count': len(text_content.split()),
-                'common_phrases': self.extract_common_phrases(text_content),
-                'content_structure': self.analyze_content_structure(text_content),
-                'key_topics': self.extract_key_topics(text_content),
-                'content_elements': self.identify_content_elements(content)
-            }
-            return analysis
-        except Exception as e:
-            print(f"Error in content analysis: {str(e)}")
-            return {}
+        return analyze_document(content, self.content_format)
 
-    def get_llm_analysis(self, context: str, system_prompt: str) -> str:
+    def get_llm_analysis(self, context: str, system_prompt: str, max_tokens: int = 3000) -> str:
         """Get LLM analysis using OpenAI API"""
         try:
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o",
+            response = create_chat_completion(
+                self.openai_client,
+                model=self.llm_model,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": context}
                 ],
                 temperature=0.7,
-                max_tokens=3000
+                max_tokens=max_tokens,
+                on_usage=self.on_usage,
+                **self.llm_call_options
             )
             return response.choices[0].message.content
         except Exception as e:
@@ -153,6 +364,12 @@ class LLMEnhancedAnalyzer:
         
         # Prepare context for LLM
         context = self.prepare_llm_context(scraped_data, serp_data)
+
+        if self.generation_mode == 'sections':
+            outline = self.generate_outline_sections(context, serp_data)
+            if outline:
+                return {'outline_structure': outline}
+            print("Falling back to single-prompt outline generation")
         
         # Define system prompts
         prompts = {
@@ -234,9 +451,44 @@ Justification:
         
         return analysis
 
+    def generate_outline_sections(self, context: str, serp_data: Dict) -> str:
+        """Generate the outline sections concurrently and merge them in canonical order.
+
+        Every section gets the same context. Returns an empty string if any section
+        failed or did not start with its label.
+        """
+        query = serp_data.get('search_parameters', {}).get('q', '')
+        header = OUTLINE_SECTION_HEADER.format(
+            query=query, secondary_keywords=', '.join(self.secondary_keywords), intent=self.article_intent
+        )
+
+        with ThreadPoolExecutor(max_workers=len(OUTLINE_SECTION_PROMPTS)) as pool:
+            futures = {
+                name: pool.submit(self.get_llm_analysis, context, header + "\n" + prompt.format(query=query), max_tokens)
+                for name, (prompt, _, max_tokens) in OUTLINE_SECTION_PROMPTS.items()
+            }
+            replies = {name: future.result() for name, future in futures.items()}
+
+        parts = []
+        for name, (_, label, _) in OUTLINE_SECTION_PROMPTS.items():
+            part = self.extract_section_reply(replies[name], label)
+            if not part:
+                print(f"Outline section '{name}' is missing or malformed")
+                return ""
+            parts.append(part)
+        return "\n\n".join(parts)
+
+    def extract_section_reply(self, reply: str, label: str) -> str:
+        """Section reply from its first label on (drops any preamble, code fences and bold markers)"""
+        match = re.search(r'^[\s*#]*' + re.escape(label.rstrip(':')) + r'\s*\**\s*:', reply or '', re.IGNORECASE | re.MULTILINE)
+        if not match:
+            return ""
+        return reply[match.start():].replace('```', '').replace('**', '').strip().lstrip('# ')
+
     def prepare_llm_context(self, scraped_data: List[Dict], serp_data: Dict) -> str:
         """Prepare context for LLM analysis"""
         serp_analysis = self.extract_serp_data(serp_data)
+        limits = self.context_limits
         
         context = f"""
 Search Query: {serp_data.get('search_parameters', {}).get('q', '')}
@@ -246,16 +498,19 @@ Article Intent: {self.article_intent}
 Secondary Keywords: {', '.join(self.secondary_keywords)}
 
 Top Ranking Articles:
-{self.format_top_articles(serp_analysis['organic_results'])}
+{self.format_top_articles(serp_analysis['organic_results'][:limits['top_articles']])}
 
 People Also Ask Questions:
-{self.format_paa_questions(serp_analysis['paa_questions'])}
+{self.format_paa_questions(serp_analysis['paa_questions'][:limits['paa_questions']])}
 
 Related Searches:
-{self.format_related_searches(serp_analysis['related_searches'])}
+{self.format_related_searches(serp_analysis['related_searches'][:limits['related_searches']])}
 
 Competitor Content Analysis:
-{self.format_competitor_content(scraped_data)}
+{self.format_competitor_content(scraped_data[:limits['competitors']])}
+
+Competitor Heading Coverage (topic [competitor pages covering it/total pages]):
+{self.format_topic_coverage(self.build_topic_coverage(scraped_data), limit=limits['coverage_topics'])}
 """
         return context
 
@@ -300,14 +555,24 @@ Competitor Content Analysis:
 
     def format_competitor_content(self, scraped_data: List[Dict]) -> str:
         try:
+            # Collapse near-duplicates into their original page
+            copies = {}
+            for data in scraped_data:
+                if data.get('duplicate_of'):
+                    copies.setdefault(data['duplicate_of'], []).append(data['url'])
+
             content_summary = []
             for data in scraped_data:
+                if data.get('duplicate_of'):
+                    continue
                 analysis = data.get('analysis', {})
                 summary = f"""
 URL: {data.get('url', '')}
 Word Count: {analysis.get('word_count', 0)}
 Key Topics: {', '.join(analysis.get('key_topics', [])[:5])}
 """
+                if copies.get(data.get('url')):
+                    summary += f"Also published at: {', '.join(copies[data['url']])}\n"
                 content_summary.append(summary)
             return "\n".join(content_summary)
         except Exception as e:
@@ -333,98 +598,154 @@ Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
             print(f"Error formatting LLM outline: {str(e)}")
             return "Error generating outline"
 
-    def extract_common_phrases(self, text_content: str) -> List[str]:
-        """Extract common phrases from text content"""
-        try:
-            # Basic phrase extraction using regex
-            phrases = re.findall(r'\b[\w\s]{10,30}\b', text_content.lower())
-            # Count and return most common phrases
-            phrase_counter = Counter(phrases)
-            return [phrase for phrase, count in phrase_counter.most_common(10)]
-        except Exception as e:
-            print(f"Error extracting common phrases: {str(e)}")
-            return []
+    def build_topic_coverage(self, scraped_data: List[Dict], max_level: int = 3) -> Dict:
+        """Merge competitor heading trees into a deduplicated topic-coverage matrix.
 
-    def analyze_content_structure(self, text_content: str) -> Dict:
-        """Analyze content structure including headings and sections"""
-        try:
-            # Basic structure analysis
-            paragraphs = text_content.split('\n\n')
-            structure = {
-                'total_paragraphs': len(paragraphs),
-                'avg_paragraph_length': sum(len(p.split()) for p in paragraphs) / len(paragraphs) if paragraphs else 0,
-            }
-            return structure
-        except Exception as e:
-            print(f"Error analyzing content structure: {str(e)}")
-            return {}
+        Returns {'pages': N, 'topics': [...]} where each topic has its heading text,
+        level, the indexes of the pages covering it and its most common parent topic.
+        """
+        pages = [
+            data for data in scraped_data
+            if not data.get('duplicate_of') and data.get('analysis', {}).get('heading_tree')
+        ]
+        topics = {}
+
+        def walk(nodes, page_index, parent_key):
+            for node in nodes:
+                key = parent_key
+                if 1 < node['level'] <= max_level:
+                    key = normalize_heading(node['text'])
+                    if key:
+                        topic = topics.setdefault(key, {
+                            'text': _HEADING_NUMBERING.sub('', node['text']).strip() or node['text'],
+                            'level': node['level'], 'pages': set(), 'parents': Counter()
+                        })
+                        topic['level'] = min(topic['level'], node['level'])
+                        topic['pages'].add(page_index)
+                        if parent_key:
+                            topic['parents'][parent_key] += 1
+                    else:
+                        key = parent_key
+                walk(node['children'], page_index, key)
+
+        for page_index, data in enumerate(pages):
+            walk(data['analysis']['heading_tree'], page_index, None)
 
-    def extract_key_topics(self, text_content: str) -> List[str]:
-        """Extract key topics from content"""
-        try:
-            # Simple keyword extraction
-            words = re.findall(r'\b\w+\b', text_content.lower())
-            # Filter common words and get most frequent
-            word_counter = Counter(words)
-            return [word for word, count in word_counter.most_common(10)]
-        except Exception as e:
-            print(f"Error extracting key topics: {str(e)}")
-            return []
+        return {
+            'pages': len(pages),
+            'topics': [
+                {
+                    'key': key,
+                    'text': topic['text'],
+                    'level': topic['level'],
+                    'pages': sorted(topic['pages']),
+                    'parent': topic['parents'].most_common(1)[0][0] if topic['parents'] else None
+                }
+                for key, topic in topics.items()
+            ]
+        }
 
-    def identify_content_elements(self, content: str) -> Dict:
-        """Identify various content elements like lists, tables, etc."""
+    def format_topic_coverage(self, coverage: Dict, limit: int = 40) -> str:
+        """Compact indented H2/H3 list with how many competitors cover each topic"""
         try:
-            soup = BeautifulSoup(content, 'html.parser')
-            elements = {
-                'lists': len(soup.find_all(['ul', 'ol'])),
-                'tables': len(soup.find_all('table')),
-                'images': len(soup.find_all('img')),
-                'links': len(soup.find_all('a')),
-                'headings': len(soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6']))
-            }
-            return elements
+            total = coverage.get('pages', 0)
+            if not total:
+                return ""
+            by_key = {topic['key']: topic for topic in coverage['topics']}
+            ranked = sorted(coverage['topics'], key=lambda topic: -len(topic['pages']))
+            children = {}
+            roots = []
+            for topic in ranked:
+                parent = topic['parent']
+                if topic['level'] > 2 and parent in by_key and by_key[parent]['level'] < topic['level']:
+                    children.setdefault(parent, []).append(topic)
+                else:
+                    roots.append(topic)
+
+            lines = []
+            for root in roots:
+                if len(lines) >= limit:
+                    break
+                lines.append(f"- H{root['level']} {root['text']} [{len(root['pages'])}/{total}]")
+                for child in children.get(root['key'], [])[:5]:
+                    lines.append(f"  - H{child['level']} {child['text']} [{len(child['pages'])}/{total}]")
+            return "\n".join(lines[:limit])
         except Exception as e:
-            print(f"Error identifying content elements: {str(e)}")
-            return {}
+            print(f"Error formatting topic coverage: {str(e)}")
+            return ""
+
+def serp_locale_params(locale: str) -> Dict:
+    """Map a Moz-style locale (e.g. 'en-GB') to SerpAPI hl/gl parameters"""
+    language, _, country = locale.partition('-')
+    return {'hl': language.lower() or 'en', 'gl': (country or 'us').lower()}
+
+
+def _print_log(level: str, message: str):
+    print(message)
 
-@st.cache_data(ttl=3600)
-def get_search_results(query: str, api_key: str, num_results: int = 10) -> Dict:
+
+def _serp_get(session: requests.Session, url: str, params: Dict):
+    """(status_code, decoded JSON or error text) of one SerpAPI request"""
+    response = session.get(url, params=params, timeout=30)
+    return response.status_code, (response.json() if response.status_code == 200 else response.text)
+
+
+def fetch_search_results(query: str, api_key: str, num_results: int = 10, hl: str = "en", gl: str = "us",
+                         log: Callable[[str, str], None] = _print_log) -> Dict:
+    """Fetch Google results from SerpAPI.
+
+    log is called with a level ('info', 'warning' or 'error') and a message.
+    """
     url = "https://serpapi.com/search"
     
     if not api_key or api_key.isspace():
-        st.error("SERPAPI_KEY is not properly configured in Streamlit secrets")
+        log("error", "SERPAPI_KEY is not properly configured")
         return None
         
     params = {
         "q": query,
         "api_key": api_key,
         "num": num_results,
-        "hl": "en",
-        "gl": "us"
+        "hl": hl,
+        "gl": gl
     }
     
-    session = get_requests_session()  # Reuse the persistent session
+    request = {k: v for k, v in params.items() if k != "api_key"}
+    response_cache = get_response_cache()
+    cached = response_cache.get("serpapi", request) if response_cache else None
+    if cached:
+        log("info", "Using cached SERP data")
+        mark_search_cached(cached)
+        return cached
+
+    session = SERP_SESSION  # Reuse the persistent session
 
     max_retries = 3
     for attempt in range(max_retries):
         try:
-            st.write(f"Attempting SERP API call (attempt {attempt + 1}/{max_retries})")
-            response = session.get(url, params=params, timeout=30)
-            st.write(f"SERP API Response Status: {response.status_code}")
+            log("info", f"Attempting SERP API call (attempt {attempt + 1}/{max_retries})")
+            status, payload = provider_call(
+                "serpapi", request,
+                lambda: _serp_get(session, url, params),
+                errors=(requests.exceptions.RequestException,)
+            )
+            log("info", f"SERP API Response Status: {status}")
             
-            if response.status_code == 200:
-                return response.json()
-            elif response.status_code == 401:
-                st.error("SERP API Authentication failed. Please check your API key.")
+            if status == 200:
+                if response_cache:
+                    response_cache.put("serpapi", request, payload)
+                return payload
+            elif status == 401:
+                log("error", "SERP API Authentication failed. Please check your API key.")
                 return None
             else:
-                st.error(f"SERP API Error: {response.status_code}, {response.text}")
+                log("error", f"SERP API Error: {status}, {payload}")
                 
         except requests.exceptions.RequestException as e:
             if attempt == max_retries - 1:
-                st.error(f"Failed to fetch SERP data after {max_retries} attempts: {str(e)}")
+                log("error", f"Failed to fetch SERP data after {max_retries} attempts: {str(e)}")
                 return None
-            st.warning(f"Attempt {attempt + 1} failed, retrying...")
+            log("warning", f"Attempt {attempt + 1} failed, retrying...")
             time.sleep(2)
     
     return None
@@ -434,13 +755,13 @@ def main():
     try:
         
         # API Keys
-        FIRECRAWL_API_KEY = st.secrets["FIRECRAWL_API_KEY"]
-        OPENAI_API_KEY = st.secrets["OPENAI_API_KEY"]
-        SERPAPI_KEY = st.secrets["SERPAPI_KEY"]
+        FIRECRAWL_API_KEY = get_secret("FIRECRAWL_API_KEY")
+        OPENAI_API_KEY = get_secret("OPENAI_API_KEY")
+        SERPAPI_KEY = get_secret("SERPAPI_KEY")
 
                 # Pre-warm the SERP API with a dummy query
         dummy_query = "warm up"
-        _ = get_search_results(dummy_query, SERPAPI_KEY, num_results=1)
+        _ = fetch_search_results(dummy_query, SERPAPI_KEY, num_results=1)
         
 
         # Get search query from user
@@ -448,7 +769,7 @@ def main():
 
         # Get SERP data directly using SerpAPI
         print("Fetching SERP data...")
-        serp_data = get_search_results(search_query, SERPAPI_KEY)
+        serp_data = fetch_search_results(search_query, SERPAPI_KEY)
         
         if not serp_data: 
             raise Exception("Failed to fetch SERP data")
@@ -485,6 +806,17 @@ def main():
         
         # Save the enhanced outline
         print("Saving outline...")
+        run_id = OutlineStore().append({
+            'query': search_query,
+            'primary_keyword': search_query,
+            'secondary_keywords': [k.strip() for k in keywords],
+            'intent': intent,
+            'outline': enhanced_outline,
+            'serp_data': serp_data,
+            'competitor_urls': [data['url'] for data in scraped_data],
+        })
+        if run_id is not None:
+            print(f"Stored outline #{run_id}")
         with open('simplifiedoutput3.txt', 'w', encoding='utf-8') as f:
             f.write(enhanced_outline)
         
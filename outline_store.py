@@ -0,0 +1,212 @@
+import hashlib
+import json
+import re
+import sqlite3
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from config import get_setting
+from sqlite_store import SQLiteStore
+
+# Outline sections and the delimiters that bound them in the LLM output
+OUTLINE_SECTIONS = {
+    "Meta Title": ("Meta title:", "Meta description:"),
+    "Meta Description": ("Meta description:", "Slug:"),
+    "Slug": ("Slug:", "Outline:"),
+    "H1 Options": ("H1 Options:", "Introduction:"),
+    "Introduction": ("Introduction:", "H2:"),
+    "Body": ("H2:", "Conclusion:"),
+    "Conclusion": ("Conclusion:", "FAQ:"),
+    "FAQ": ("FAQ:", "Writing Guidelines:"),
+    "Writing Guidelines": ("Writing Guidelines:", "Article Type Prediction:"),
+    "Article Type Prediction": ("Article Type Prediction:", "Justification:"),
+    "Justification": ("Justification:", None),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS serp_snapshots (
+    id TEXT PRIMARY KEY,
+    query TEXT NOT NULL,
+    fetched_at TEXT NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS outlines (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    query TEXT NOT NULL,
+    query_key TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    primary_keyword TEXT,
+    secondary_keywords TEXT,
+    intent TEXT,
+    outline TEXT,
+    sections TEXT,
+    keyword_analysis TEXT,
+    serp_snapshot_id TEXT REFERENCES serp_snapshots(id),
+    competitor_urls TEXT,
+    timings TEXT,
+    token_usage TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_outlines_query_date ON outlines(query_key, created_at);
+CREATE INDEX IF NOT EXISTS idx_outlines_date ON outlines(created_at);
+"""
+
+_JSON_COLUMNS = ("secondary_keywords", "sections", "keyword_analysis", "competitor_urls", "timings", "token_usage")
+
+
+def query_key(query: str) -> str:
+    """Case- and whitespace-insensitive lookup key for a query"""
+    return " ".join(query.lower().split())
+
+
+def _section_pattern(delimiter: str):
+    # Allow optional spaces and an optional colon after the delimiter words
+    return re.compile(re.escape(delimiter.rstrip(":")) + r"\s*:?", re.IGNORECASE)
+
+
+def parse_outline_sections(outline: str) -> Dict[str, str]:
+    """Split an outline into its named sections; missing sections are omitted"""
+    sections = {}
+    if not outline:
+        return sections
+    for name, (start_delimiter, end_delimiter) in OUTLINE_SECTIONS.items():
+        start_match = _section_pattern(start_delimiter).search(outline)
+        if not start_match:
+            continue
+        start = start_match.end()
+        end = len(outline)
+        if end_delimiter:
+            end_match = _section_pattern(end_delimiter).search(outline, start)
+            if end_match:
+                end = end_match.start()
+        content = outline[start:end].strip()
+        if name == "Body" and content:
+            content = "H2: " + content
+        if content:
+            sections[name] = content
+    return sections
+
+
+def has_outline(record: Dict) -> bool:
+    """False for failed runs: an empty outline, or one without any outline section"""
+    outline = record.get("outline") or ""
+    return bool(outline.strip()) and bool(record.get("sections") or parse_outline_sections(outline))
+
+
+# Rows of failed runs stored before has_outline() was checked on append
+_HAS_OUTLINE = "outline != '' AND sections NOT IN ('', '{}', 'null')"
+
+
+class OutlineStore(SQLiteStore):
+    """SQLite store of generated outlines, indexed by query and date"""
+
+    def __init__(self, path: Optional[str] = None):
+        super().__init__(path or get_setting("OUTLINE_STORE_PATH"), SCHEMA)
+
+    def _save_snapshot(self, conn, query: str, serp_data: Optional[Dict]) -> Optional[str]:
+        """Store a SERP response once (content-addressed) and return its reference"""
+        if not serp_data:
+            return None
+        payload = json.dumps(serp_data, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        snapshot_id = hashlib.sha1(payload).hexdigest()
+        conn.execute(
+            "INSERT OR IGNORE INTO serp_snapshots (id, query, fetched_at, data) VALUES (?, ?, ?, ?)",
+            (snapshot_id, query, datetime.now().isoformat(timespec="seconds"), zlib.compress(payload))
+        )
+        return snapshot_id
+
+    def _row_values(self, conn, record: Dict) -> tuple:
+        query = record["query"]
+        outline = record.get("outline", "")
+        snapshot_id = record.get("serp_snapshot_id") or self._save_snapshot(conn, query, record.get("serp_data"))
+        return (
+            query,
+            query_key(query),
+            record.get("created_at") or datetime.now().isoformat(timespec="seconds"),
+            record.get("primary_keyword", ""),
+            json.dumps(record.get("secondary_keywords", [])),
+            record.get("intent", ""),
+            outline,
+            json.dumps(record.get("sections") or parse_outline_sections(outline)),
+            json.dumps(record.get("keyword_analysis", {})),
+            snapshot_id,
+            json.dumps(record.get("competitor_urls", [])),
+            json.dumps(record.get("timings", {})),
+            json.dumps(record.get("token_usage", {})),
+        )
+
+    _INSERT = """
+        INSERT INTO outlines (query, query_key, created_at, primary_keyword, secondary_keywords, intent,
+                              outline, sections, keyword_analysis, serp_snapshot_id, competitor_urls,
+                              timings, token_usage)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+
+    def append(self, record: Dict) -> Optional[int]:
+        """Store one pipeline result and return its id, or None if it has no outline"""
+        ids = self.append_many([record])
+        return ids[0] if ids else None
+
+    def append_many(self, records: List[Dict]) -> List[int]:
+        """Store many pipeline results in a single transaction; failed runs are skipped"""
+        ids = []
+        with self._lock, self._connect() as conn:
+            for record in records:
+                if not has_outline(record):
+                    print(f"Not storing the empty outline for {record['query']}")
+                    continue
+                cursor = conn.execute(self._INSERT, self._row_values(conn, record))
+                ids.append(cursor.lastrowid)
+        return ids
+
+    def _decode(self, row: sqlite3.Row) -> Dict:
+        record = dict(row)
+        for column in _JSON_COLUMNS:
+            record[column] = json.loads(record[column]) if record.get(column) else None
+        return record
+
+    def get(self, run_id: int) -> Optional[Dict]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM outlines WHERE id = ?", (run_id,)).fetchone()
+        return self._decode(row) if row else None
+
+    def latest(self, query: str, max_age: Optional[timedelta] = None) -> Optional[Dict]:
+        """Most recent non-empty outline for a query, optionally no older than max_age"""
+        results = self.find(query=query, since=datetime.now() - max_age if max_age else None, limit=1,
+                            with_outline=True)
+        return results[0] if results else None
+
+    def find(self, query: Optional[str] = None, since: Optional[datetime] = None,
+             until: Optional[datetime] = None, limit: int = 100, with_outline: bool = False) -> List[Dict]:
+        """Outlines matching a query and/or date range, newest first"""
+        clauses, params = [_HAS_OUTLINE] if with_outline else [], []
+        if query is not None:
+            clauses.append("query_key = ?")
+            params.append(query_key(query))
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since.isoformat(timespec="seconds"))
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until.isoformat(timespec="seconds"))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT * FROM outlines {where} ORDER BY created_at DESC, id DESC LIMIT ?",
+                params + [limit]
+            ).fetchall()
+        return [self._decode(row) for row in rows]
+
+    def iter_latest_queries(self):
+        """(id, query) of the newest non-empty outline per distinct query, oldest first"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT MAX(id) AS id, query FROM outlines WHERE {_HAS_OUTLINE} GROUP BY query_key ORDER BY id"
+            ).fetchall()
+        for row in rows:
+            yield row["id"], row["query"]
+
+    def get_serp_snapshot(self, snapshot_id: str) -> Optional[Dict]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT data FROM serp_snapshots WHERE id = ?", (snapshot_id,)).fetchone()
+        return json.loads(zlib.decompress(row["data"])) if row else None
@@ -0,0 +1,195 @@
+import json
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from og import LLMEnhancedAnalyzer, fetch_search_results, serp_locale_params, CONTEXT_LIMITS
+from key_pred2 import analyze_keywords, parse_keyword_analysis, expand_keywords_for_markets, DEFAULT_MARKET
+from outline_store import OutlineStore, parse_outline_sections
+from fingerprints import FingerprintStore
+from analysis_executor import AnalysisExecutor
+from config import load_config
+from metering import RunMeter, BudgetExceededError
+from llm_client import get_latency_stats
+
+# Sites Firecrawl cannot scrape usefully
+UNSUPPORTED_DOMAINS = ['youtube.com', 'reddit.com', 'twitter.com', 'facebook.com']
+
+
+class PipelineError(Exception):
+    """Raised when a pipeline stage cannot produce the data the next stage needs"""
+
+
+def select_urls_to_scrape(serp_data: Dict, limit: int = 5) -> List[str]:
+    """First supported organic result URLs"""
+    return [
+        result['link']
+        for result in serp_data.get('organic_results', [])[:limit + 2]  # Get more results to compensate for filtered ones
+        if not any(domain in result['link'].lower() for domain in UNSUPPORTED_DOMAINS)
+    ][:limit]
+
+
+def generate_outline(query: str, api_keys: Dict[str, str], markets: Optional[List[Dict]] = None,
+                     progress: Optional[Callable[[str, float], None]] = None,
+                     fingerprint_store: Optional[FingerprintStore] = None,
+                     analysis_executor: Optional[AnalysisExecutor] = None,
+                     search_results: Callable = fetch_search_results,
+                     meter: Optional[RunMeter] = None,
+                     generation_mode: Optional[str] = None, content_format: Optional[str] = None) -> Dict:
+    """Run the full keyword -> SERP -> scrape -> LLM pipeline for one query.
+
+    api_keys holds 'firecrawl', 'openai' and 'serpapi'. progress is called with a log
+    message and a 0..1 progress value before each stage. search_results fetches the
+    SERP (fetch_search_results by default; the app passes its cached wrapper).
+    Usage is recorded on meter (a new
+    RunMeter by default): near a budget cap fewer keywords and pages are fetched,
+    keyword selection stays local and the LLM context is compacted; with no budget
+    left BudgetExceededError is raised. generation_mode ('single' or 'sections') and
+    content_format ('html' or 'markdown') default to the OUTLINE_GENERATION and
+    CONTENT_FORMAT settings. Returns a result dict that can be stored with
+    OutlineStore.append().
+    """
+    progress = progress or (lambda message, value: print(message))
+    markets = markets or [DEFAULT_MARKET]
+    meter = meter or RunMeter(label=query)
+    timings = {}
+    status = "error"
+
+    def timed(stage, func, *args, **kwargs):
+        meter.check(stage)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timings[stage] = round(time.perf_counter() - start, 3)
+
+    try:
+        progress("🔍 Getting keyword suggestions and analysis...", 0.1)
+        keywords_data = timed(
+            "keywords", expand_keywords_for_markets, query, markets,
+            limit=meter.scaled("keyword suggestions", 10, 5), meter=meter
+        )
+        if not keywords_data:
+            raise PipelineError("❌ No suggested keywords found.")
+
+        progress("🎯 Analyzing keywords...", 0.3)
+        selection = {"mode": "local"} if meter.near_cap() else None
+        analysis_result = timed(
+            "keyword_analysis", analyze_keywords, query, keywords_data, selection=selection, on_usage=meter
+        )
+
+        # Parse the analysis result to get intent along with keywords
+        parsed_analysis = parse_keyword_analysis(analysis_result) or {}
+        primary_keyword = parsed_analysis.get("primary_keyword", "")
+        secondary_keywords = parsed_analysis.get("secondary_keywords", [])
+        content_intent = parsed_analysis.get("intent", "")
+
+        if not primary_keyword:
+            # Keyword analysis failed or timed out; continue with the raw query
+            primary_keyword = query
+
+        progress("🌐 Fetching SERP data...", 0.5)
+        serp_data = timed(
+            "serp", search_results,
+            primary_keyword, api_keys["serpapi"], **serp_locale_params(markets[0]["locale"])
+        )
+        if not serp_data:
+            raise PipelineError("Failed to fetch SERP data")
+        meter.record_serp(serp_data)
+
+        progress("⚙️ Initializing content analyzer...", 0.6)
+        analyzer = LLMEnhancedAnalyzer(
+            firecrawl_api_key=api_keys["firecrawl"],
+            openai_api_key=api_keys["openai"],
+            on_usage=meter,
+            fingerprint_store=fingerprint_store or FingerprintStore(),
+            analysis_executor=analysis_executor,
+            meter=meter,
+            generation_mode=generation_mode,
+            content_format=content_format
+        )
+
+        # Use the automatically determined intent
+        analyzer.set_content_parameters(
+            intent=content_intent,
+            keywords=secondary_keywords
+        )
+
+        urls_to_scrape = select_urls_to_scrape(serp_data, limit=meter.scaled("competitor pages", 5, 3))
+
+        progress("🔎 Scanning competitor content...", 0.7)
+        scraped_data = timed("scrape", analyzer.scrape_competitor_content, urls_to_scrape)
+
+        progress("✍️ Crafting enhanced content outline...", 0.9)
+        if meter.near_cap():
+            meter.reductions.append("llm context: compact")
+            analyzer.context_limits = CONTEXT_LIMITS['compact']
+        enhanced_outline = timed("outline", analyzer.generate_enhanced_outline, serp_data, scraped_data)
+        timings["total"] = round(sum(timings.values()), 3)
+        timings.update(analyzer.analysis_timings)
+        status = "ok"
+    finally:
+        usage = meter.finish(status)
+
+    return {
+        "query": query,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "primary_keyword": primary_keyword,
+        "secondary_keywords": secondary_keywords,
+        "intent": content_intent,
+        "outline": enhanced_outline,
+        "sections": parse_outline_sections(enhanced_outline),
+        "keyword_analysis": {
+            "raw": analysis_result,
+            "keywords_data": keywords_data,
+            "markets": markets,
+        },
+        "serp_data": serp_data,
+        "competitor_urls": [data['url'] for data in scraped_data],
+        "duplicate_urls": {data['url']: data['duplicate_of'] for data in scraped_data if data.get('duplicate_of')},
+        "timings": timings,
+        "token_usage": meter.tokens_by_model,
+        "usage": usage,
+    }
+
+
+def api_keys_from_config(config: Dict) -> Dict[str, str]:
+    return {
+        "firecrawl": config["FIRECRAWL_API_KEY"],
+        "openai": config["OPENAI_API_KEY"],
+        "serpapi": config["SERPAPI_KEY"],
+    }
+
+
+def run_batch(queries: List[str], api_keys: Dict[str, str], store: OutlineStore,
+              markets: Optional[List[Dict]] = None, chunk_size: int = 10) -> List[int]:
+    """Generate outlines for many queries, appending results to the store in chunks"""
+    stored_ids, pending = [], []
+    for query in queries:
+        try:
+            pending.append(generate_outline(query, api_keys, markets))
+        except BudgetExceededError as e:
+            print(f"Stopping batch at {query}: {str(e)}")
+            break
+        except Exception as e:
+            print(f"Error generating outline for {query}: {str(e)}")
+        if len(pending) >= chunk_size:
+            stored_ids.extend(store.append_many(pending))
+            pending = []
+    if pending:
+        stored_ids.extend(store.append_many(pending))
+    return stored_ids
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python pipeline.py <queries.txt> [store.db]")
+        sys.exit(1)
+
+    with open(sys.argv[1], encoding='utf-8') as f:
+        batch_queries = [line.strip() for line in f if line.strip()]
+    batch_store = OutlineStore(sys.argv[2]) if len(sys.argv) > 2 else OutlineStore()
+    ids = run_batch(batch_queries, api_keys_from_config(load_config()), batch_store)
+    print(f"Stored {len(ids)} outlines in {batch_store.path}")
+    print(f"OpenAI latency: {json.dumps(get_latency_stats())}")
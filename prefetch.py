@@ -0,0 +1,342 @@
+"""Warm provider caches for queries on the editorial calendar.
+
+Calendar file, one entry per line (blank lines and '#' comments are ignored):
+
+    2026-10-21 best running shoes for flat feet
+    2026-10-22 how to clean suede shoes
+
+During off-peak hours every entry due within the lead time is run through the keyword,
+SERP and scrape stages, which fills the Moz, SerpAPI and Firecrawl entries of the
+persistent response cache and the stored page analyses. With --outline the full
+outline is generated and stored as well, so the app's reuse option serves it directly.
+
+Usage:
+    python prefetch.py calendar.txt [--once] [--outline] [--lead-days 2] [--budget 5]
+"""
+import argparse
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from config import get_setting, load_config
+from key_pred2 import analyze_keywords, parse_keyword_analysis, expand_keywords_for_markets, DEFAULT_MARKET
+from og import LLMEnhancedAnalyzer, fetch_search_results, serp_locale_params
+from outline_store import OutlineStore, query_key
+from fingerprints import FingerprintStore
+from metering import RunMeter, BudgetExceededError, BUDGETS
+from pipeline import generate_outline, select_urls_to_scrape, api_keys_from_config
+from response_cache import CACHE_TTLS
+from sqlite_store import SQLiteStore
+
+# Local hours [start, end) in which the scheduler prefetches
+OFF_PEAK_HOURS = (1, 6)
+
+# Calendar entries are warmed this many days before their date
+PREFETCH_LEAD_DAYS = 2
+
+# Spend cap for one scheduler pass
+PREFETCH_BUDGET_USD = 5.0
+
+# Sustained rate per second and burst per provider, in metering units
+# (calls for Moz, searches for SerpAPI, credits for Firecrawl, tokens for OpenAI)
+RATE_LIMITS = {
+    "moz": (2.0, 20),
+    "serpapi": (0.5, 5),
+    "firecrawl": (1.0, 10),
+    "openai": (500.0, 30000),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prefetch_runs (
+    query_key TEXT NOT NULL,
+    due_date TEXT NOT NULL,
+    warmed_at REAL NOT NULL,
+    stages TEXT NOT NULL,
+    cost_usd REAL NOT NULL,
+    PRIMARY KEY (query_key, due_date)
+);
+"""
+
+
+class TokenBucket:
+    """Token bucket that may go into debt: usage is charged after the fact and later
+    callers wait until the debt is repaid"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self, units: float):
+        with self._lock:
+            self._refill()
+            self.tokens -= units
+
+    def take(self, units: float = 1):
+        """Block until units are available, then consume them"""
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= min(units, self.capacity):
+                    self.tokens -= units
+                    return
+                delay = (min(units, self.capacity) - self.tokens) / self.rate
+            time.sleep(delay)
+
+    def wait(self):
+        """Block until the bucket is out of debt"""
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 0:
+                    return
+                delay = -self.tokens / self.rate
+            time.sleep(delay)
+
+
+class RateLimiter:
+    def __init__(self, limits: Dict[str, Tuple[float, float]] = None):
+        self.buckets = {provider: TokenBucket(rate, burst) for provider, (rate, burst) in (limits or RATE_LIMITS).items()}
+
+    def consume(self, provider: str, units: float):
+        if provider in self.buckets:
+            self.buckets[provider].consume(units)
+
+    def take(self, provider: str, units: float = 1):
+        if provider in self.buckets:
+            self.buckets[provider].take(units)
+
+    def wait(self, *providers: str):
+        for provider in providers:
+            if provider in self.buckets:
+                self.buckets[provider].wait()
+
+
+class PrefetchMeter(RunMeter):
+    """RunMeter that rate-limits live provider calls.
+
+    Call sites that acquire() before each call (Moz, Firecrawl) take one unit up front,
+    so concurrent lookups cannot burst past the limit; record() charges the rest of the
+    reported units. Other providers are charged after the fact and throttled at stage
+    boundaries with RateLimiter.wait().
+    """
+
+    def __init__(self, label: str, budget: float, limiter: RateLimiter):
+        super().__init__(label=label, budget=budget)
+        self.limiter = limiter
+        self._acquired: Dict[str, int] = {}
+
+    def acquire(self, provider: str):
+        self.limiter.take(provider)
+        with self._lock:
+            self._acquired[provider] = self._acquired.get(provider, 0) + 1
+
+    def record(self, provider: str, units: int = 1, cost: Optional[float] = None, cached: bool = False):
+        super().record(provider, units, cost, cached)
+        if cached:
+            return
+        with self._lock:
+            prepaid = 1 if self._acquired.get(provider) else 0
+            self._acquired[provider] = self._acquired.get(provider, 0) - prepaid
+        if units > prepaid:
+            self.limiter.consume(provider, units - prepaid)
+
+
+class PrefetchLog(SQLiteStore):
+    """Which calendar entries were warmed, when, and at what cost"""
+
+    def __init__(self, path: str):
+        super().__init__(path, SCHEMA)
+
+    def warmed_since(self, query: str, due_date: str, since: float) -> bool:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM prefetch_runs WHERE query_key = ? AND due_date = ? AND warmed_at >= ?",
+                (query_key(query), due_date, since)
+            ).fetchone()
+        return row is not None
+
+    def record(self, query: str, due_date: str, stages: List[str], cost: float):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO prefetch_runs (query_key, due_date, warmed_at, stages, cost_usd) VALUES (?, ?, ?, ?, ?)",
+                (query_key(query), due_date, time.time(), ",".join(stages), cost)
+            )
+
+
+def load_calendar(path: str) -> List[Dict]:
+    """Calendar entries as {'date': 'YYYY-MM-DD', 'query': ...}"""
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            day, _, query = line.partition(" ")
+            try:
+                date.fromisoformat(day)
+            except ValueError:
+                print(f"Skipping calendar line {line_number}: expected 'YYYY-MM-DD query'")
+                continue
+            if query.strip():
+                entries.append({"date": day, "query": query.strip()})
+    return entries
+
+
+def due_entries(entries: List[Dict], lead_days: int, today: Optional[date] = None) -> List[Dict]:
+    """Entries dated from today to today + lead_days, soonest first"""
+    today = today or date.today()
+    last = today + timedelta(days=lead_days)
+    due = [entry for entry in entries if today <= date.fromisoformat(entry["date"]) <= last]
+    return sorted(due, key=lambda entry: entry["date"])
+
+
+def in_off_peak(now: Optional[datetime] = None) -> bool:
+    start, end = OFF_PEAK_HOURS
+    hour = (now or datetime.now()).hour
+    return start <= hour < end if start <= end else hour >= start or hour < end
+
+
+def seconds_until_off_peak(now: Optional[datetime] = None) -> float:
+    now = now or datetime.now()
+    start = now.replace(hour=OFF_PEAK_HOURS[0], minute=0, second=0, microsecond=0)
+    if start <= now:
+        start += timedelta(days=1)
+    return (start - now).total_seconds()
+
+
+def warm_query(query: str, api_keys: Dict[str, str], meter: PrefetchMeter, limiter: RateLimiter,
+               fingerprint_store: FingerprintStore, markets: Optional[List[Dict]] = None) -> List[str]:
+    """Run the keyword, SERP and scrape stages the way generate_outline does; returns the stages warmed"""
+    markets = markets or [DEFAULT_MARKET]
+    stages = []
+
+    limiter.wait("moz")
+    meter.check("keywords")
+    keywords_data = expand_keywords_for_markets(query, markets, meter=meter)
+    if not keywords_data:
+        return stages
+    stages.append("moz")
+
+    limiter.wait("openai")
+    parsed = parse_keyword_analysis(analyze_keywords(query, keywords_data, on_usage=meter)) or {}
+    primary_keyword = parsed.get("primary_keyword") or query
+
+    limiter.wait("serpapi")
+    meter.check("serp")
+    serp_data = fetch_search_results(primary_keyword, api_keys["serpapi"], **serp_locale_params(markets[0]["locale"]))
+    if not serp_data:
+        return stages
+    meter.record_serp(serp_data)
+    stages.append("serp")
+
+    limiter.wait("firecrawl")
+    meter.check("scrape")
+    analyzer = LLMEnhancedAnalyzer(
+        firecrawl_api_key=api_keys["firecrawl"],
+        openai_api_key=api_keys["openai"],
+        fingerprint_store=fingerprint_store,
+        meter=meter
+    )
+    if analyzer.scrape_competitor_content(select_urls_to_scrape(serp_data)):
+        stages.append("scrape")
+    return stages
+
+
+def prefetch_due(calendar_path: str, lead_days: int = PREFETCH_LEAD_DAYS, outline: bool = False,
+                 budget: float = PREFETCH_BUDGET_USD, respect_window: bool = True) -> Dict:
+    """One scheduler pass over the due calendar entries; returns counts and cost"""
+    config = load_config()
+    api_keys = api_keys_from_config(config)
+    store_path = config["OUTLINE_STORE_PATH"]
+    log = PrefetchLog(store_path)
+    fingerprint_store = FingerprintStore(store_path)
+    outline_store = OutlineStore(store_path) if outline else None
+    limiter = RateLimiter()
+
+    # Entries warmed more recently than the SERP TTL are still served from the cache
+    fresh_since = time.time() - CACHE_TTLS["serpapi"]
+    summary = {"warmed": 0, "skipped": 0, "failed": 0, "cost_usd": 0.0}
+    for entry in due_entries(load_calendar(calendar_path), lead_days):
+        if respect_window and not in_off_peak():
+            print("Off-peak window closed, stopping")
+            break
+        if log.warmed_since(entry["query"], entry["date"], fresh_since):
+            summary["skipped"] += 1
+            continue
+        remaining = budget - summary["cost_usd"]
+        if remaining <= 0:
+            print(f"Prefetch budget of ${budget:.2f} spent, stopping")
+            break
+
+        meter = PrefetchMeter(f"prefetch: {entry['query']}", min(BUDGETS["run_usd"], remaining), limiter)
+        print(f"Prefetching {entry['query']} (due {entry['date']})")
+        try:
+            if outline:
+                limiter.wait(*RATE_LIMITS)
+                result = generate_outline(
+                    entry["query"], api_keys, search_results=fetch_search_results,
+                    fingerprint_store=fingerprint_store, meter=meter
+                )
+                outline_store.append(result)
+                stages = ["moz", "serp", "scrape", "outline"]
+            else:
+                status = "error"
+                try:
+                    stages = warm_query(entry["query"], api_keys, meter, limiter, fingerprint_store)
+                    status = "ok"
+                finally:
+                    meter.finish(status)
+            log.record(entry["query"], entry["date"], stages, meter.cost)
+            summary["warmed"] += 1
+        except BudgetExceededError as e:
+            print(f"Stopping prefetch: {str(e)}")
+            summary["cost_usd"] += meter.cost
+            break
+        except Exception as e:
+            print(f"Error prefetching {entry['query']}: {str(e)}")
+            summary["failed"] += 1
+        summary["cost_usd"] += meter.cost
+
+    summary["cost_usd"] = round(summary["cost_usd"], 4)
+    return summary
+
+
+def run_scheduler(calendar_path: str, lead_days: int = PREFETCH_LEAD_DAYS, outline: bool = False,
+                  budget: float = PREFETCH_BUDGET_USD):
+    """Prefetch once per off-peak window, forever; the calendar file is re-read each time"""
+    while True:
+        if in_off_peak():
+            print(f"Prefetch pass: {prefetch_due(calendar_path, lead_days, outline, budget)}")
+        delay = seconds_until_off_peak()
+        print(f"Next prefetch window in {delay / 3600:.1f}h")
+        time.sleep(delay)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm caches for queries on the editorial calendar")
+    parser.add_argument("calendar", help="File with 'YYYY-MM-DD query' lines")
+    parser.add_argument("--once", action="store_true", help="Run one pass now, ignoring the off-peak window")
+    parser.add_argument("--outline", action="store_true", help="Also generate and store the full outlines")
+    parser.add_argument("--lead-days", type=int, default=PREFETCH_LEAD_DAYS)
+    parser.add_argument("--budget", type=float, default=PREFETCH_BUDGET_USD, help="USD per pass")
+    args = parser.parse_args()
+
+    if not get_setting("RESPONSE_CACHE_PATH"):
+        print("RESPONSE_CACHE_PATH is empty: only outlines and page analyses can be warmed")
+    if args.once:
+        print(prefetch_due(args.calendar, args.lead_days, args.outline, args.budget, respect_window=False))
+    else:
+        run_scheduler(args.calendar, args.lead_days, args.outline, args.budget)
+
+
+if __name__ == "__main__":
+    main()
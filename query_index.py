@@ -0,0 +1,158 @@
+import hashlib
+import re
+import threading
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from keyword_selector import keyword_tokens
+
+# Queries at or above this cosine similarity are offered for reuse
+SIMILARITY_THRESHOLD = 0.9
+
+# Words that do not change what a query is about
+STOPWORDS = frozenset(["a", "an", "the", "of", "for", "to", "in", "on", "and", "or", "with", "my", "your"])
+
+# Words that give the words around them a role ('dog food for cats'); symmetric ones
+# such as 'vs' and 'and' are left out, since swapping their sides keeps the meaning
+RELATION_WORDS = frozenset(["for", "to", "from", "in", "on", "with", "without", "near", "into",
+                            "than", "over", "under", "after", "before", "against", "like"])
+
+_NON_WORD = re.compile(r"[^\w\s]")
+
+
+def normalize_query(query: str) -> str:
+    """Exact-match key: lowercase with whitespace collapsed. Word order is kept, since
+    'dog food for cats' and 'cat food for dogs' are different queries."""
+    return " ".join(query.lower().split())
+
+
+def query_tokens(text: str) -> List[str]:
+    """Singular lowercase tokens in text order, without punctuation or stopwords"""
+    tokens = [token for word in _NON_WORD.sub(" ", text).split() for token in keyword_tokens(word)]
+    return [t for t in tokens if t not in STOPWORDS] or tokens
+
+
+def unordered_key(text: str) -> str:
+    """Order-insensitive key: the query tokens sorted (for headings, not for queries)"""
+    return " ".join(sorted(set(query_tokens(text))))
+
+
+def _relation_sides(query: str) -> Dict[str, Tuple[frozenset, frozenset]]:
+    """Content tokens before and after the first occurrence of each relation word"""
+    words = _NON_WORD.sub(" ", query.lower()).split()
+    content = [keyword_tokens(word) - STOPWORDS if word not in RELATION_WORDS else frozenset() for word in words]
+    sides = {}
+    for i, word in enumerate(words):
+        if word in RELATION_WORDS and word not in sides:
+            sides[word] = (frozenset().union(*content[:i]), frozenset().union(*content[i + 1:]))
+    return sides
+
+
+def swaps_roles(a: str, b: str) -> bool:
+    """True if a content word sits on one side of a relation word in a and on the other
+    side of it in b: 'dog food for cats' vs 'cat food for dogs', 'new york to boston' vs
+    'boston to new york'. Plain reorderings ('running shoes best') do not count."""
+    sides_a, sides_b = _relation_sides(a), _relation_sides(b)
+    for word in sides_a.keys() & sides_b.keys():
+        (before_a, after_a), (before_b, after_b) = sides_a[word], sides_b[word]
+        if before_a & after_b or after_a & before_b:
+            return True
+    return False
+
+
+def _features(tokens: List[str]) -> List[Tuple[str, float]]:
+    """Word unigrams plus character trigrams of each word (catches spelling variants)"""
+    features = []
+    for token in tokens:
+        features.append(("w:" + token, 1.0))
+        padded = f"#{token}#"
+        for i in range(len(padded) - 2):
+            features.append(("c:" + padded[i:i + 3], 0.5))
+    return features
+
+
+class QueryIndex:
+    """Brute-force cosine index over hashed n-gram vectors of normalized queries.
+
+    Rows live in a preallocated NumPy matrix that doubles when full, so inserts are
+    amortised O(dim) and a search is a single matrix-vector product.
+    """
+
+    def __init__(self, dim: int = 2048, initial_capacity: int = 256):
+        self.dim = dim
+        self._matrix = np.zeros((initial_capacity, dim), dtype=np.float32)
+        self._queries: List[str] = []
+        self._refs: List[Hashable] = []
+        self._exact: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._refs)
+
+    def vectorize(self, query: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in _features(query_tokens(query)):
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            sign = 1.0 if value & 1 else -1.0  # signed hashing keeps collisions unbiased
+            vector[(value >> 1) % self.dim] += sign * weight
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def add(self, query: str, ref: Hashable):
+        """Index a query; a newer ref for the same normalized query replaces the old one"""
+        normalized = normalize_query(query)
+        vector = self.vectorize(query)
+        with self._lock:
+            row = self._exact.get(normalized)
+            if row is None:
+                row = len(self._refs)
+                if row == self._matrix.shape[0]:
+                    grown = np.zeros((row * 2, self.dim), dtype=np.float32)
+                    grown[:row] = self._matrix
+                    self._matrix = grown
+                self._queries.append(query)
+                self._refs.append(ref)
+                self._exact[normalized] = row
+            else:
+                self._queries[row] = query
+                self._refs[row] = ref
+            self._matrix[row] = vector
+
+    def search(self, query: str, k: int = 5, threshold: float = 0.0) -> List[Dict]:
+        """Most similar indexed queries, best first"""
+        vector = self.vectorize(query)
+        with self._lock:
+            count = len(self._refs)
+            if not count:
+                return []
+            scores = self._matrix[:count] @ vector
+            queries, refs = list(self._queries), list(self._refs)
+        k = min(k, count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {"query": queries[i], "ref": refs[i], "similarity": round(float(scores[i]), 4)}
+            for i in top if scores[i] >= threshold
+        ]
+
+    def best_match(self, query: str, threshold: float = SIMILARITY_THRESHOLD) -> Optional[Dict]:
+        """Closest indexed query at or above the threshold that does not swap the roles
+        of its words (see swaps_roles), or None"""
+        with self._lock:
+            row = self._exact.get(normalize_query(query))
+            if row is not None:
+                return {"query": self._queries[row], "ref": self._refs[row], "similarity": 1.0}
+        for match in self.search(query, k=5, threshold=threshold):
+            if not swaps_roles(query, match["query"]):
+                return match
+        return None
+
+    @classmethod
+    def from_store(cls, store, **kwargs) -> "QueryIndex":
+        """Build an index over the latest stored outline of every query"""
+        index = cls(**kwargs)
+        for run_id, query in store.iter_latest_queries():
+            index.add(query, run_id)
+        return index
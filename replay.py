@@ -0,0 +1,211 @@
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import get_setting
+
+# Provider call recording: PROVIDER_RECORDING is 'record', 'replay' or empty (live calls),
+# PROVIDER_ARCHIVE the gzip JSONL archive and REPLAY_LATENCY_SCALE the factor applied to
+# recorded latencies during replay (1.0 = original timing, 0 = no waiting).
+MODES = ("", "record", "replay")
+
+
+class ReplayMissError(LookupError):
+    """Raised in replay mode when the archive holds no response for a request"""
+
+
+def request_key(provider: str, request: Dict) -> str:
+    """Stable hash of a provider request (credentials must not be part of it)"""
+    canonical = json.dumps([provider, request], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+class ProviderRecorder:
+    """Records provider responses with their latencies, or replays them.
+
+    Each archive line is one call: provider, request key, optional fallback key, latency
+    in seconds and either the encoded response or the error message. Every line is
+    written as its own gzip member, so the archive is complete after each call even
+    if the process never shuts down cleanly. Identical requests
+    are replayed in recorded order (the last response repeats once they run out). When
+    the exact request is missing, a call with the same fallback key is used, so changes
+    to prompt assembly can still be replayed.
+    """
+
+    def __init__(self, mode: str = "", path: Optional[str] = None, latency_scale: float = 1.0):
+        if mode not in MODES:
+            raise ValueError(f"Unknown recording mode: {mode!r}")
+        self.mode = mode
+        self.path = path
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[Dict]] = {}
+        self._fallbacks: Dict[str, List[Dict]] = {}
+        self._served: Dict[str, int] = {}
+        self.stats = {"recorded": 0, "replayed": 0, "fallback": 0, "missed": 0}
+        if mode == "replay":
+            self._load()
+
+    @classmethod
+    def from_config(cls) -> "ProviderRecorder":
+        return cls(get_setting("PROVIDER_RECORDING"), get_setting("PROVIDER_ARCHIVE"),
+                   get_setting("REPLAY_LATENCY_SCALE"))
+
+    def _load(self):
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        print(f"Skipping a corrupt entry in {self.path}")
+                        continue
+                    self._entries.setdefault(entry["key"], []).append(entry)
+                    if entry.get("fallback_key"):
+                        self._fallbacks.setdefault(entry["fallback_key"], []).append(entry)
+        except (EOFError, gzip.BadGzipFile) as e:
+            # A process killed mid-write leaves a truncated last member; keep what came before
+            print(f"Ignoring the truncated end of {self.path}: {str(e)}")
+        print(f"Loaded {sum(len(v) for v in self._entries.values())} recorded provider calls from {self.path}")
+
+    def _write(self, entry: Dict):
+        member = gzip.compress((json.dumps(entry, separators=(",", ":"), default=str) + "\n").encode("utf-8"))
+        with self._lock:
+            with open(self.path, "ab") as f:
+                f.write(member)
+            self.stats["recorded"] += 1
+
+    def _next(self, index: Dict[str, List[Dict]], key: str) -> Optional[Dict]:
+        entries = index.get(key)
+        if not entries:
+            return None
+        served_key = f"{id(index)}:{key}"
+        position = self._served.get(served_key, 0)
+        self._served[served_key] = position + 1
+        return entries[min(position, len(entries) - 1)]
+
+    def call(self, provider: str, request: Dict, func: Callable, errors: Tuple = (),
+             fallback_request: Optional[Dict] = None,
+             encode: Callable = None, decode: Callable = None):
+        """Run func() live, recording it, or serve its recorded result.
+
+        Exceptions of the types in errors are recorded as well and replayed as errors[0]
+        with the original message. encode/decode convert responses to and from JSON.
+        """
+        if not self.mode:
+            return func()
+
+        key = request_key(provider, request)
+        fallback_key = request_key(provider, fallback_request) if fallback_request is not None else None
+
+        if self.mode == "replay":
+            with self._lock:
+                entry = self._next(self._entries, key)
+                kind = "replayed"
+                if entry is None and fallback_key:
+                    entry = self._next(self._fallbacks, fallback_key)
+                    kind = "fallback"
+                self.stats[kind if entry else "missed"] += 1
+            if entry is None:
+                raise ReplayMissError(f"No recorded {provider} response for request {key[:12]}")
+            if self.latency_scale > 0:
+                time.sleep(entry["latency"] * self.latency_scale)
+            if "error" in entry:
+                raise (errors[0] if errors else RuntimeError)(entry["error"])
+            return decode(entry["response"]) if decode else entry["response"]
+
+        start = time.perf_counter()
+        entry = {"provider": provider, "key": key, "fallback_key": fallback_key}
+        try:
+            response = func()
+        except errors as e:
+            self._write({**entry, "latency": round(time.perf_counter() - start, 4), "error": str(e)})
+            raise
+        self._write({
+            **entry,
+            "latency": round(time.perf_counter() - start, 4),
+            "response": encode(response) if encode else response,
+        })
+        return response
+
+
+recorder = ProviderRecorder.from_config()
+
+
+def provider_call(provider: str, request: Dict, func: Callable, **kwargs):
+    """Route one provider call through the process recorder (see ProviderRecorder.call)"""
+    return recorder.call(provider, request, func, **kwargs)
+
+
+def set_recording(mode: str, path: Optional[str] = None, latency_scale: float = 1.0) -> ProviderRecorder:
+    """Switch the process recorder, e.g. from a benchmark script"""
+    global recorder
+    recorder = ProviderRecorder(mode, path or get_setting("PROVIDER_ARCHIVE"), latency_scale)
+    return recorder
+
+
+def run_queries(queries: List[str], mode: str, archive: str, latency_scale: float) -> List[Dict]:
+    """Generate outlines for queries while recording or replaying provider calls"""
+    import tempfile
+    from config import load_config
+    from fingerprints import FingerprintStore
+    from metering import usage_meter
+    from og import fetch_search_results
+    from pipeline import generate_outline, api_keys_from_config
+    from response_cache import set_response_cache
+
+    set_recording(mode, archive, latency_scale)
+    set_response_cache("")  # every provider call must reach the recorder
+    usage_meter.log_path = ""  # keep recorded/replayed runs out of the usage log
+    api_keys = api_keys_from_config(load_config())
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        # A fresh fingerprint store per invocation, so stored analyses do not skip scrapes
+        fingerprint_store = FingerprintStore(os.path.join(tmp, "fingerprints.db"))
+        for query in queries:
+            start = time.perf_counter()
+            try:
+                result = generate_outline(query, api_keys, search_results=fetch_search_results,
+                                          fingerprint_store=fingerprint_store)
+                timings = result["timings"]
+            except Exception as e:
+                print(f"Error generating outline for {query}: {str(e)}")
+                timings = {"error": str(e)}
+            runs.append({"query": query, "seconds": round(time.perf_counter() - start, 3), "timings": timings})
+    return runs
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Record or replay provider calls of pipeline runs")
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("queries", help="Text file with one query per line")
+    parser.add_argument("--archive", default=get_setting("PROVIDER_ARCHIVE"))
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="Replay latency factor (1 = as recorded, 0 = no waiting)")
+    parser.add_argument("--json", help="Also write per-query timings to this file")
+    args = parser.parse_args()
+
+    if args.mode == "record" and os.path.exists(args.archive):
+        sys.exit(f"{args.archive} already exists; remove it or pass another --archive")
+    with open(args.queries, encoding="utf-8") as f:
+        batch_queries = [line.strip() for line in f if line.strip()]
+
+    # The provider modules use the imported replay module, not this __main__ copy
+    import replay
+
+    results = replay.run_queries(batch_queries, args.mode, args.archive, args.latency_scale)
+    for run in results:
+        print(f"{run['seconds']:>8.3f}s  {run['query']}  {run['timings']}")
+    print(f"Total {sum(run['seconds'] for run in results):.3f}s; provider calls: {replay.recorder.stats}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"runs": results, "provider_calls": replay.recorder.stats}, f, indent=2)
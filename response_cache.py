@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+import zlib
+from typing import Dict, Optional
+
+from config import get_setting
+from replay import request_key
+from sqlite_store import SQLiteStore
+
+# Seconds a stored provider response stays fresh. Long enough for the prefetch
+# scheduler to warm planned queries ahead of their calendar date.
+CACHE_TTLS = {
+    "moz": 7 * 86400,
+    "serpapi": 2 * 86400,
+    "firecrawl": 3 * 86400,
+}
+
+# Expired responses are deleted when the cache is opened and at most this often
+# (in seconds) while it is written to, so the file does not grow without bound
+PURGE_INTERVAL = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS provider_responses (
+    provider TEXT NOT NULL,
+    key TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (provider, key)
+);
+CREATE INDEX IF NOT EXISTS idx_provider_responses_date ON provider_responses(fetched_at);
+"""
+
+
+class ResponseCache(SQLiteStore):
+    """Persistent, cross-process cache of Moz, SerpAPI and Firecrawl responses.
+
+    Shared by the app, the API and the prefetch scheduler through the same SQLite file;
+    payloads are stored as compressed JSON under the hash of the request.
+    """
+
+    def __init__(self, path: str):
+        super().__init__(path, SCHEMA)
+        self._purged_at = 0.0
+        self._purge_if_due()
+
+    def _purge_if_due(self):
+        if time.time() - self._purged_at >= PURGE_INTERVAL:
+            self._purged_at = time.time()
+            removed = self.purge_expired()
+            if removed:
+                print(f"Purged {removed} expired provider responses from {self.path}")
+
+    def get(self, provider: str, request: Dict, max_age: Optional[float] = None):
+        """Stored payload for the request, or None if missing or older than the TTL"""
+        max_age = CACHE_TTLS[provider] if max_age is None else max_age
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT data FROM provider_responses WHERE provider = ? AND key = ? AND fetched_at >= ?",
+                (provider, request_key(provider, request), time.time() - max_age)
+            ).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row else None
+
+    def put(self, provider: str, request: Dict, payload):
+        data = zlib.compress(json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8"))
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO provider_responses (provider, key, fetched_at, data) VALUES (?, ?, ?, ?)",
+                (provider, request_key(provider, request), time.time(), data)
+            )
+        self._purge_if_due()
+
+    def purge_expired(self) -> int:
+        """Delete responses older than their provider's TTL; returns the number removed"""
+        removed = 0
+        with self._lock, self._connect() as conn:
+            for provider, ttl in CACHE_TTLS.items():
+                removed += conn.execute(
+                    "DELETE FROM provider_responses WHERE provider = ? AND fetched_at < ?",
+                    (provider, time.time() - ttl)
+                ).rowcount
+        return removed
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Process-wide cache at RESPONSE_CACHE_PATH, or None when that setting is empty"""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            path = get_setting("RESPONSE_CACHE_PATH")
+            _response_cache = ResponseCache(path) if path else False
+        return _response_cache or None
+
+
+def set_response_cache(path: str) -> Optional[ResponseCache]:
+    """Point the process-wide cache at another file; an empty path disables it"""
+    global _response_cache
+    with _response_cache_lock:
+        _response_cache = ResponseCache(path) if path else False
+        return _response_cache or None
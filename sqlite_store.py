@@ -0,0 +1,30 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class SQLiteStore:
+    """Base for the stores kept in the shared SQLite file (outlines, fingerprints,
+    provider responses, prefetch log).
+
+    Creates the subclass schema on construction; _connect() yields a short-lived
+    connection that commits on success and is always closed. Rows can be read by
+    column name or index. self._lock serializes writes within the process.
+    """
+
+    def __init__(self, path: str, schema: str):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(schema)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()